@@ -0,0 +1,194 @@
+'''
+Content-addressed store for the contents of attachments.
+
+This software is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This sotfware is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with this library. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import contextlib
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+import uuid
+
+# MIME types whose contents are compressed already
+INCOMPRESSIBLE_TYPES = {
+    'application/gzip', 'application/x-gzip', 'application/zip', 'application/x-bzip2',
+    'application/x-xz', 'application/x-7z-compressed', 'application/x-rar-compressed',
+    'application/pdf', 'application/java-archive', 'application/vnd.debian.binary-package',
+}
+
+def is_compressible(filename):
+    """
+    Guess from the name of an attachment whether compressing it is worthwhile.
+    """
+    if filename.endswith(('.tgz', '.tbz', '.tbz2', '.txz', '.whl', '.egg', '.sobj')):
+        return False
+    mimetype, encoding = mimetypes.guess_type(filename)
+    if encoding is not None or mimetype in INCOMPRESSIBLE_TYPES:
+        return False
+    if mimetype is None:
+        return True
+    major, _, minor = mimetype.partition('/')
+    if major in ('image', 'audio', 'video'):
+        return minor == 'svg+xml'
+    return True
+
+class BlobMissing(LookupError):
+    "The blob is not in the store, for example because it was removed by :meth:`BlobStore.cull`"
+
+class BlobStore:
+    """
+    Files in ``directory`` named by the SHA-256 digest of their contents, so
+    that equal contents are stored once. Compressed blobs are gzip files with
+    the suffix ``.gz``.
+
+    Reading a blob marks it as recently used. When the blobs take more than
+    ``size_limit`` bytes, the least recently used ones are removed.
+    """
+    def __init__(self, directory, size_limit=None):
+        self.directory = directory
+        self.size_limit = size_limit
+        self._tmp = os.path.join(directory, 'tmp')
+        os.makedirs(self._tmp, exist_ok=True)
+        self._lock = threading.Lock()
+        self._size = sum(entry.stat().st_size for entry in self._blobs())
+
+    def _blobs(self):
+        for subdir in os.scandir(self.directory):
+            if subdir.is_dir() and subdir.name != 'tmp':
+                yield from os.scandir(subdir.path)
+
+    def _path(self, digest, compressed):
+        return os.path.join(self.directory, digest[:2], digest + ('.gz' if compressed else ''))
+
+    def find(self, digest):
+        """
+        Return the path of the blob ``digest`` and whether it is compressed,
+        or ``None`` if there is no such blob.
+        """
+        for compressed in (False, True):
+            path = self._path(digest, compressed)
+            with contextlib.suppress(FileNotFoundError):
+                os.utime(path)
+                return path, compressed
+        return None
+
+    def __contains__(self, digest):
+        return self.find(digest) is not None
+
+    def open(self, digest):
+        """
+        Open the blob ``digest`` for reading its uncompressed contents.
+
+        Raise :class:`BlobMissing` if there is no such blob.
+        """
+        found = self.find(digest)
+        if found is None:
+            raise BlobMissing(digest)
+        path, compressed = found
+        try:
+            if compressed:
+                return gzip.open(path, 'rb')
+            return open(path, 'rb')
+        except FileNotFoundError:
+            # removed since it was found
+            raise BlobMissing(digest) from None
+
+    def temporary_filename(self):
+        "Return a new file name in the directory of the store"
+        return os.path.join(self._tmp, uuid.uuid4().hex)
+
+    def put_file(self, filename, compress=True):
+        """
+        Move the file ``filename`` into the store, compressed if ``compress``
+        is true, and return its digest.
+        """
+        sha256 = hashlib.sha256()
+        if compress:
+            stored = self.temporary_filename()
+            with open(filename, 'rb') as src, open(stored, 'wb') as dst:
+                with gzip.GzipFile(filename='', mode='wb', fileobj=dst, mtime=0) as gz:
+                    while chunk := src.read(1 << 20):
+                        sha256.update(chunk)
+                        gz.write(chunk)
+            os.remove(filename)
+        else:
+            stored = filename
+            with open(filename, 'rb') as src:
+                while chunk := src.read(1 << 20):
+                    sha256.update(chunk)
+        return self._add(stored, sha256.hexdigest(), compress)
+
+    def put_bytes(self, data, compress=True):
+        """
+        Store ``data``, compressed if ``compress`` is true, and return its digest.
+        """
+        stored = self.temporary_filename()
+        with open(stored, 'wb') as f:
+            if compress:
+                with gzip.GzipFile(filename='', mode='wb', fileobj=f, mtime=0) as gz:
+                    gz.write(data)
+            else:
+                f.write(data)
+        return self._add(stored, hashlib.sha256(data).hexdigest(), compress)
+
+    def put_blob(self, fileobj, compressed):
+        """
+        Store a blob as read from the file object ``fileobj``, which is gzipped
+        if ``compressed`` is true, and return its digest.
+        """
+        stored = self.temporary_filename()
+        with open(stored, 'wb') as f:
+            while chunk := fileobj.read(1 << 20):
+                f.write(chunk)
+        sha256 = hashlib.sha256()
+        with (gzip.open if compressed else open)(stored, 'rb') as f:
+            while chunk := f.read(1 << 20):
+                sha256.update(chunk)
+        return self._add(stored, sha256.hexdigest(), compressed)
+
+    def blobs(self):
+        "Generate the digest, whether it is compressed and the path of all blobs"
+        for entry in self._blobs():
+            digest, _, suffix = entry.name.partition('.')
+            yield digest, suffix == 'gz', entry.path
+
+    def _add(self, stored, digest, compressed):
+        with self._lock:
+            if digest in self:
+                os.remove(stored)
+                return digest
+            path = self._path(digest, compressed)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._size += os.path.getsize(stored)
+            os.replace(stored, path)
+        self.cull()
+        return digest
+
+    def cull(self):
+        """
+        Remove the least recently used blobs until the store fits into ``size_limit``.
+        """
+        with self._lock:
+            if self.size_limit is None or self._size <= self.size_limit:
+                return
+            blobs = sorted(((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                            for entry in self._blobs()), reverse=True)
+            while blobs and self._size > self.size_limit:
+                _, size, path = blobs.pop()
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+                self._size -= size
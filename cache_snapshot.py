@@ -0,0 +1,107 @@
+'''
+Snapshots of the cached Trac data, to copy a warm cache to other machines.
+
+A snapshot is a gzipped tar file with a manifest ``snapshot.json``, the cache
+entries as a stream of pickled ``(key, value)`` pairs in ``entries.pickle``
+and the attachment blobs as they are stored in ``blobs/``.
+
+This software is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This sotfware is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with this library. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import io
+import json
+import logging
+import os
+import pickle
+import tarfile
+import tempfile
+import time
+
+log = logging.getLogger("trac_to_gh")
+
+# Incremented whenever the layout of snapshots or of the cache keys changes
+SNAPSHOT_FORMAT = 1
+
+# entries that expired or were evicted during the export
+_missing = object()
+
+def export_snapshot(cache, blob_store, filename, **metadata):
+    """
+    Write the entries of the ``diskcache.Cache`` ``cache`` and the blobs of
+    the :class:`blob_store.BlobStore` ``blob_store`` to the snapshot ``filename``.
+
+    ``metadata`` is added to the manifest.
+    """
+    manifest = dict(metadata, format=SNAPSHOT_FORMAT, created=time.time(), entries=0, blobs=0)
+    with tempfile.TemporaryFile() as entries:
+        for key in cache.iterkeys():
+            value = cache.get(key, default=_missing)
+            if value is not _missing:
+                pickle.dump((key, value), entries, protocol=pickle.HIGHEST_PROTOCOL)
+                manifest['entries'] += 1
+        entries_size = entries.tell()
+        entries.seek(0)
+
+        part = filename + '.part'
+        with tarfile.open(part, 'w:gz') as tar:
+            blobs = list(blob_store.blobs())
+            manifest['blobs'] = len(blobs)
+            data = json.dumps(manifest, indent=2).encode('utf-8')
+            info = tarfile.TarInfo('snapshot.json')
+            info.size = len(data)
+            info.mtime = manifest['created']
+            tar.addfile(info, io.BytesIO(data))
+            info = tarfile.TarInfo('entries.pickle')
+            info.size = entries_size
+            info.mtime = manifest['created']
+            tar.addfile(info, entries)
+            for digest, compressed, path in blobs:
+                tar.add(path, arcname='blobs/' + digest + ('.gz' if compressed else ''))
+        os.replace(part, filename)
+    log.info(f'Exported {manifest["entries"]} cache entries and {manifest["blobs"]} attachments to {filename}')
+    return manifest
+
+def import_snapshot(cache, blob_store, filename):
+    """
+    Add the entries and blobs of the snapshot ``filename`` to ``cache`` and
+    ``blob_store``, replacing cached entries with the same keys.
+
+    The snapshot is read as a stream, so that it may be as large as the cache.
+    """
+    with tarfile.open(filename, 'r|gz') as tar:
+        manifest = None
+        entries = blobs = 0
+        for member in tar:
+            if member.name == 'snapshot.json':
+                manifest = json.load(tar.extractfile(member))
+                if manifest.get('format') != SNAPSHOT_FORMAT:
+                    raise ValueError(f'Snapshot format {manifest.get("format")} is not supported '
+                                     f'(expected {SNAPSHOT_FORMAT})')
+                continue
+            if manifest is None:
+                raise ValueError(f'{filename} is not a snapshot of trac_cache')
+            if member.name == 'entries.pickle':
+                f = tar.extractfile(member)
+                while True:
+                    try:
+                        key, value = pickle.load(f)
+                    except EOFError:
+                        break
+                    cache.set(key, value, retry=True)
+                    entries += 1
+            elif member.name.startswith('blobs/') and member.isfile():
+                blob_store.put_blob(tar.extractfile(member), member.name.endswith('.gz'))
+                blobs += 1
+    log.info(f'Imported {entries} cache entries and {blobs} attachments from {filename}')
+    return manifest
@@ -0,0 +1,119 @@
+'''
+Statistics of the use of the cache of Trac data.
+
+This software is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This sotfware is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with this library. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import functools
+import os
+import threading
+from collections import defaultdict
+from time import monotonic
+
+from diskcache import Disk
+from diskcache.core import ENOVAL, UNKNOWN
+
+class MeasuringDisk(Disk):
+    """
+    ``diskcache.Disk`` that remembers, per thread, the number of bytes of the
+    last value that was stored or fetched.
+    """
+    _local = threading.local()
+
+    def _measure(self, filename, value):
+        if value is None:
+            try:
+                return os.path.getsize(os.path.join(self._directory, filename))
+            except (OSError, TypeError):
+                return 0
+        if isinstance(value, (bytes, str, memoryview)):
+            return len(value)
+        return 8
+
+    def store(self, value, read, key=UNKNOWN):
+        size, mode, filename, db_value = super().store(value, read, key)
+        self._local.stored = size or self._measure(filename, db_value)
+        return size, mode, filename, db_value
+
+    def fetch(self, mode, filename, value, read):
+        self._local.fetched = self._measure(filename, value)
+        return super().fetch(mode, filename, value, read)
+
+    @classmethod
+    def last_stored(cls):
+        return getattr(cls._local, 'stored', 0)
+
+    @classmethod
+    def last_fetched(cls):
+        return getattr(cls._local, 'fetched', 0)
+
+class CacheStatistics:
+    """
+    Thread-safe counters per memoized function: calls answered from the cache
+    (``hits``), calls that went to Trac (``misses``) and their total duration
+    (``miss_seconds``), results stored by batched prefetching (``prefetched``,
+    ``prefetch_seconds``) and the bytes read from and written to the cache.
+    """
+    fields = ('hits', 'misses', 'prefetched', 'bytes_read', 'bytes_written',
+              'miss_seconds', 'prefetch_seconds')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(lambda: dict.fromkeys(self.fields, 0))
+
+    def add(self, name, **increments):
+        with self._lock:
+            counters = self._counters[name]
+            for field, increment in increments.items():
+                counters[field] += increment
+
+    def as_dict(self):
+        "Return the counters by function name, with the mean latency of a miss"
+        with self._lock:
+            result = {}
+            for name, counters in sorted(self._counters.items()):
+                counters = dict(counters)
+                counters['mean_miss_seconds'] = (counters['miss_seconds'] / counters['misses']
+                                                 if counters['misses'] else 0.0)
+                result[name] = counters
+            return result
+
+def memoize(cache, statistics, ignore=()):
+    """
+    Like ``cache.memoize(ignore=ignore)`` with the same cache keys, but
+    counting the hits and misses of the decorated function in ``statistics``.
+
+    ``cache`` must use a :class:`MeasuringDisk`.
+    """
+    def decorator(func):
+        cache_key = cache.memoize(ignore=ignore)(func).__cache_key__
+        name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = cache_key(*args, **kwargs)
+            result = cache.get(key, default=ENOVAL, retry=True)
+            if result is not ENOVAL:
+                statistics.add(name, hits=1, bytes_read=MeasuringDisk.last_fetched())
+                return result
+            start = monotonic()
+            result = func(*args, **kwargs)
+            seconds = monotonic() - start
+            cache.set(key, result, retry=True)
+            statistics.add(name, misses=1, miss_seconds=seconds, bytes_written=MeasuringDisk.last_stored())
+            return result
+
+        wrapper.__cache_key__ = cache_key
+        return wrapper
+    return decorator
@@ -41,14 +41,23 @@ import logging
 import mimetypes
 import types
 import gzip
+import http.client
+import hashlib
 import json
-from collections import defaultdict
+import shutil
+import functools
+import threading
+from collections import OrderedDict, defaultdict, deque
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
 from copy import copy
 from datetime import datetime
 from difflib import unified_diff
-from time import sleep
+from time import sleep, monotonic
+from urllib.parse import urlparse
 from roman import toRoman
 from xmlrpc import client
+from xml.parsers.expat import ExpatError
 from github import Github, GithubObject, InputFileContent
 from github.Attachment import Attachment
 from github.NamedUser import NamedUser
@@ -57,12 +66,19 @@ from github.GithubException import IncompletableObject
 from enum import Enum
 
 from migration_archive_writer import MigrationArchiveWritingRequester
+from trac_xmlrpc import RpcScheduler, ScheduledServerProxy, pooled_transport, streaming_base64_transport
+import trac_xmlrpc_async
+from blob_store import BlobMissing, BlobStore, is_compressible
+from cache_snapshot import export_snapshot, import_snapshot
+from cache_statistics import CacheStatistics, MeasuringDisk, memoize
+from trac_database import TracDatabaseSource, attachment_file, is_trac_environment
 
 import markdown
 from markdown.extensions.tables import TableExtension
 
 from rich.console import Console
 from rich.table import Table
+from rich.progress import Progress, MofNCompleteColumn
 
 #import github as gh
 #gh.enable_console_debug_logging()
@@ -82,8 +98,16 @@ MD_EXT = ''
 sleep_after_request = 2.0
 sleep_after_attachment = 60.0
 sleep_after_10tickets = 0.0  # TODO maybe this can be reduced due to the longer sleep after attaching something
-sleep_before_xmlrpc = 0.33
-sleep_before_xmlrpc_retry = 30.0
+
+# ./migrate.py [migrate|prefetch] [configuration file]
+# ./migrate.py export-cache|import-cache snapshot_file [configuration file]
+command = 'migrate'
+if len(sys.argv) > 1 and sys.argv[1] in ('migrate', 'prefetch', 'export-cache', 'import-cache'):
+    command = sys.argv.pop(1)
+if command in ('export-cache', 'import-cache'):
+    if len(sys.argv) < 2:
+        sys.exit(f'usage: {sys.argv[0]} {command} snapshot_file [configuration file]')
+    snapshot_filename = sys.argv.pop(1)
 
 config = configparser.ConfigParser(default_config)
 if len(sys.argv) > 1 :
@@ -107,6 +131,94 @@ if config.has_option('source', 'path') :
 
 keep_trac_ticket_references = config.getboolean('source', 'keep_trac_ticket_references')
 
+# Directory of the Trac environment on the local filesystem. The option path
+# is used if it happens to be a Trac environment.
+trac_env_path = None
+if config.has_option('source', 'env_path'):
+    trac_env_path = config.get('source', 'env_path')
+elif is_trac_environment(trac_path):
+    trac_env_path = trac_path
+
+# Read tickets, milestones and wiki pages via 'xmlrpc' or directly from the 'database'
+# of the Trac environment
+source_backend = 'xmlrpc'
+if config.has_option('source', 'backend'):
+    source_backend = config.get('source', 'backend')
+if source_backend not in ('xmlrpc', 'database'):
+    raise ValueError(f'Unknown source backend {source_backend}')
+if source_backend == 'database' and not trac_env_path:
+    raise ValueError('The database backend needs the path of the Trac environment (option env_path)')
+
+# Refetch only the tickets and wiki pages that changed in Trac since the previous run
+incremental = False
+if config.has_option('source', 'incremental'):
+    incremental = config.getboolean('source', 'incremental')
+
+# Serve everything from trac_cache without contacting Trac, failing on the first
+# call whose result is not cached
+offline = False
+if config.has_option('source', 'offline'):
+    offline = config.getboolean('source', 'offline')
+if offline and incremental:
+    raise ValueError('Incremental runs need to ask Trac for changes and cannot be offline')
+
+# Upper bound for the number of simultaneous XML-RPC requests to the Trac server,
+# shared by all threads (including the attachment downloads)
+max_concurrent_requests = 1
+if config.has_option('source', 'max_concurrent_requests'):
+    max_concurrent_requests = config.getint('source', 'max_concurrent_requests')
+
+# Number of tickets whose changelogs are fetched ahead of the conversion (0 = disabled)
+prefetch_tickets_ahead = 0
+if config.has_option('source', 'prefetch_tickets_ahead'):
+    prefetch_tickets_ahead = config.getint('source', 'prefetch_tickets_ahead')
+
+# Pacing of the XML-RPC requests shared by all threads: at most requests_per_second
+# on average (0 for no limit), lowered while the server reports errors. Transient
+# errors are retried up to max_retries times (-1 for no limit) with exponential
+# backoff, and all requests pause for breaker_cooldown seconds after
+# breaker_threshold consecutive failures or when the server is overloaded.
+requests_per_second = 3.0
+if config.has_option('source', 'requests_per_second'):
+    requests_per_second = config.getfloat('source', 'requests_per_second')
+max_retries = 10
+if config.has_option('source', 'max_retries'):
+    max_retries = config.getint('source', 'max_retries')
+breaker_threshold = 5
+if config.has_option('source', 'breaker_threshold'):
+    breaker_threshold = config.getint('source', 'breaker_threshold')
+breaker_cooldown = 60.0
+if config.has_option('source', 'breaker_cooldown'):
+    breaker_cooldown = config.getfloat('source', 'breaker_cooldown')
+
+# Fetch tickets, changelogs and attachment lists with the asyncio client, keeping
+# max_concurrent_requests requests in flight, before the conversion starts
+async_fetch = False
+if config.has_option('source', 'async_fetch'):
+    async_fetch = config.getboolean('source', 'async_fetch')
+
+# Number of tickets fetched per page; the next page is fetched while the
+# tickets of the current one are converted
+ticket_page_size = 200
+if config.has_option('source', 'ticket_page_size'):
+    ticket_page_size = config.getint('source', 'ticket_page_size')
+
+# Grouping of XML-RPC calls into MultiCall requests. The batch size starts at
+# multicall_batch_size and is adapted so that responses take about
+# multicall_target_latency seconds and stay below multicall_max_payload bytes.
+multicall_batch_size = 10
+if config.has_option('source', 'multicall_batch_size'):
+    multicall_batch_size = config.getint('source', 'multicall_batch_size')
+multicall_max_batch_size = 200
+if config.has_option('source', 'multicall_max_batch_size'):
+    multicall_max_batch_size = config.getint('source', 'multicall_max_batch_size')
+multicall_target_latency = 5.0
+if config.has_option('source', 'multicall_target_latency'):
+    multicall_target_latency = config.getfloat('source', 'multicall_target_latency')
+multicall_max_payload = int(5e6)
+if config.has_option('source', 'multicall_max_payload'):
+    multicall_max_payload = config.getint('source', 'multicall_max_payload')
+
 class subdir(Enum):
     """
     Enum for subdirectories of `trac_url_dir`
@@ -190,13 +302,30 @@ milestone_prefix_to = ''
 if config.has_option('target', 'milestone_prefix'):
      milestone_prefix_to = config.get('target', 'milestone_prefix')
 
+def ticket_id_set(ids):
+    """
+    Return the set of ticket ids given by a list of ids, ``(first, last)`` pairs
+    and ``'first-last'`` strings. Ranges include both ends.
+    """
+    result = set()
+    for item in ids:
+        if isinstance(item, str):
+            first, _, last = item.partition('-')
+            item = (int(first), int(last or first))
+        if isinstance(item, (tuple, list)):
+            first, last = item
+            result.update(range(first, last + 1))
+        else:
+            result.add(int(item))
+    return result
+
 must_convert_issues = config.getboolean('issues', 'migrate')
 only_issues = None
 if config.has_option('issues', 'only_issues'):
-    only_issues = ast.literal_eval(config.get('issues', 'only_issues'))
+    only_issues = ticket_id_set(ast.literal_eval(config.get('issues', 'only_issues')))
 blacklist_issues = None
 if config.has_option('issues', 'blacklist_issues'):
-    blacklist_issues = ast.literal_eval(config.get('issues', 'blacklist_issues'))
+    blacklist_issues = ticket_id_set(ast.literal_eval(config.get('issues', 'blacklist_issues')))
 filter_issues = 'max=0&order=id'
 if config.has_option('issues', 'filter_issues') :
     filter_issues = config.get('issues', 'filter_issues')
@@ -262,6 +391,16 @@ if attachment_export:
             attachment_export_url += '/'
         attachment_export_url += 'files/'
 
+# Attachments are downloaded by max_concurrent_downloads worker threads into a
+# store below the cache directory, in which the least recently used contents
+# are dropped beyond blob_store_size_limit bytes
+blob_store_size_limit = int(20e9)
+if config.has_option('attachments', 'blob_store_size_limit'):
+    blob_store_size_limit = int(config.getfloat('attachments', 'blob_store_size_limit'))
+max_concurrent_downloads = max_concurrent_requests
+if config.has_option('attachments', 'max_concurrent_downloads'):
+    max_concurrent_downloads = config.getint('attachments', 'max_concurrent_downloads')
+
 must_convert_wiki = config.getboolean('wiki', 'migrate')
 wiki_export_dir = None
 if must_convert_wiki or config.has_option('wiki', 'export_dir'):
@@ -274,8 +413,20 @@ if config.has_option('source', 'default_multilines') :
     # trac2markdown
     default_multilines = config.getboolean('source', 'default_multilines')
 
+# Keep converted ticket texts in the cache conversion_cache for later runs
+use_conversion_cache = True
+if config.has_option('source', 'conversion_cache'):
+    use_conversion_cache = config.getboolean('source', 'conversion_cache')
+
 from diskcache import Cache
-cache = Cache('trac_cache', size_limit=int(20e9))
+# Only metadata is cached, which must never be evicted
+cache = Cache('trac_cache', eviction_policy='none', disk=MeasuringDisk)
+cache_stats = CacheStatistics()
+blob_store = BlobStore(os.path.join(cache.directory, 'blobs'), size_limit=blob_store_size_limit)
+# Markdown of converted ticket texts, which can always be converted again
+conversion_cache = None
+if use_conversion_cache:
+    conversion_cache = Cache('conversion_cache', disk=MeasuringDisk)
 
 gh_labels = dict()
 gh_user = None
@@ -315,6 +466,7 @@ elif must_convert_wiki:
 
 RE_CAMELCASE1 = re.compile(r'(?<=\s)((?:[A-Z][a-z0-9]+){2,})(?=[\s\.\,\:\;\?\!])')
 RE_CAMELCASE2 = re.compile(r'(?<=\s)((?:[A-Z][a-z0-9]+){2,})$')
+RE_CAMELCASE_TRIGGER = re.compile(r'\s[A-Z][a-z0-9]+[A-Z][a-z0-9]')  # needed by both rules above
 RE_HEADING1 = re.compile(r'^(=)\s(.+)\s=\s*([\#][^\s]*)?')
 RE_HEADING2 = re.compile(r'^(==)\s(.+)\s==\s*([\#][^\s]*)?')
 RE_HEADING3 = re.compile(r'^(===)\s(.+)\s===\s*([\#][^\s]*)?')
@@ -434,6 +586,40 @@ link_displ = Brackets('OPENING__LEFT__BRACKET', 'CLOSING__RIGHT__BRACKET', '[',
 proc_code = Brackets('OPENING__PROCESSOR__CODE', 'CLOSING__PROCESSOR__CODE', '```', '```')
 proc_td = Brackets('OPENING__PROCESSOR__TD', 'CLOSING__PROCESSOR__TD', r'<div align="left">', r'</div>')
 
+class RuleFamily:
+    """
+    Substitution rules applied one after the other, each to the result of the
+    ones before, as by separate calls of ``re.sub``. Their alternation is
+    searched first, so that a string that no rule matches is scanned once
+    instead of once per rule.
+    """
+    def __init__(self, *rules):
+        self._rules = rules
+        # no groups of its own, so that the alternatives can share a literal prefix
+        self._re = re.compile('|'.join('(?:%s)' % rule.pattern for rule in rules))
+
+    def sub(self, repl, string):
+        """
+        Return the string with the matches of all rules replaced. ``repl`` is a
+        replacement for all rules or a tuple with one replacement per rule,
+        which is a template or a function as for ``re.sub``.
+        """
+        if not self._re.search(string):
+            return string
+        for i, rule in enumerate(self._rules):
+            string = rule.sub(repl[i] if isinstance(repl, tuple) else repl, string)
+        return string
+
+RE_HTTPS = RuleFamily(RE_HTTPS1, RE_HTTPS2, RE_HTTPS3, RE_HTTPS4)
+RE_IMAGE = RuleFamily(RE_IMAGE1, RE_IMAGE2, RE_IMAGE3, RE_IMAGE4, RE_IMAGE5, RE_IMAGE6)
+RE_TICKET_COMMENT = RuleFamily(RE_TICKET_COMMENT1, RE_TICKET_COMMENT2, RE_TICKET_COMMENT3,
+                               RE_TICKET_COMMENT4, RE_TICKET_COMMENT5, RE_TICKET_COMMENT6)
+RE_COMMENT = RuleFamily(RE_COMMENT1, RE_COMMENT2, RE_COMMENT3, RE_COMMENT4)
+RE_ATTACHMENT = RuleFamily(RE_ATTACHMENT1, RE_ATTACHMENT2, RE_ATTACHMENT3, RE_ATTACHMENT4,
+                           RE_ATTACHMENT5, RE_ATTACHMENT6, RE_ATTACHMENT7, RE_ATTACHMENT8)
+RE_WIKI = RuleFamily(RE_WIKI4, RE_WIKI5, RE_WIKI6, RE_WIKI7)
+RE_WIKI_BRACKETS = RuleFamily(RE_WIKI1, RE_WIKI2, RE_WIKI3, RE_WIKI31)
+
 class SourceUrlConversionHelper:
     """
     Conversion helper for pattern involving url-data from source configuration.
@@ -443,6 +629,7 @@ class SourceUrlConversionHelper:
 
     def __init__(self, url):
         self._re = {}
+        self._literals = {}
         if not url:
             # path might be optional dependend on configuration
             return
@@ -455,6 +642,12 @@ class SourceUrlConversionHelper:
                 continue
             path = os.path.join(url, path)
             self._re[reg] = re.compile(r'%s%s' % (self._url_pattern(path), expr))
+            # contained in every URL that the expression matches
+            self._literals[reg] = self._url_literal(path)
+        self._host = os.path.commonprefix(list(self._literals.values()))
+
+    def _url_literal(self, url):
+        return url.split('://', 1)[-1]
 
     def _url_pattern(self, url):
         pattern = url.replace('https', 'https?')
@@ -465,7 +658,13 @@ class SourceUrlConversionHelper:
         if not len(self._re):
             # all expressions are optional and not activ
             return text
+        if self._host not in text:
+            # no URL of this host at all
+            return text
         for reg in self._re.keys():
+            if self._literals[reg] not in text:
+                # no URL with the path of this expression
+                continue
             expr, path, argument = reg.value
             text = self._re[reg].sub(argument, text)
         return text
@@ -722,7 +921,96 @@ def github_mention(match):
         return '@' + github_username
     return '`@`' + username
 
+# Increase whenever the output of trac2markdown changes, to ignore the
+# conversions cached by earlier versions
+CONVERTER_VERSION = 1
+
+# Settings that converted ticket texts depend on, besides the users map; any
+# configuration value that the conversion reads belongs here
+conversion_settings = ('MD_EXT', 'trac_url', 'trac_path', 'cgit_url', 'keep_trac_ticket_references',
+                       'target_url_issues_repo', 'target_url_git_repo', 'target_url_wiki',
+                       'attachment_export', 'attachment_export_url', 'migration_archive',
+                       'create_wiki_link_conversion_table', 'wiki_path_conversion_table')
+conversion_settings_digest = None
+
+# Ticket texts converted in this run, as in conversion_cache; the old value of
+# a description change is the new value of the previous change, and the current
+# description is converted once more
+conversion_memo = OrderedDict()
+conversion_memo_size = 256
+
+# The (origname, is_mention, username) of each user name converted by the
+# current call of _trac2markdown
+username_lookups = None
+
+def conversion_key(text, base_path, conv_help, multilines):
+    """
+    Return a digest of a ticket text, the context of its conversion and the
+    settings that the result depends on.
+    """
+    global conversion_settings_digest
+    if conversion_settings_digest is None:
+        settings = [CONVERTER_VERSION, github is not None]
+        settings += [globals().get(name) for name in conversion_settings]
+        conversion_settings_digest = hashlib.sha256(repr(settings).encode('utf-8')).hexdigest()
+    context = (conversion_settings_digest, conv_help.pagenames_digest, type(conv_help).__name__,
+               getattr(conv_help, '_ticket_id', None), base_path, multilines)
+    digest = hashlib.sha256(repr(context).encode('utf-8'))
+    digest.update(text.encode('utf-8'))
+    return digest.hexdigest()
+
+def replay_username_lookups(lookups):
+    """
+    Convert the user names of a cached conversion again, counting the unmapped
+    ones, if they all give the same names as before; return whether they did.
+    """
+    if any(map_trac_username(origname, is_mention)[0] != username
+           for origname, is_mention, username in lookups):
+        return False
+    for origname, is_mention, _ in lookups:
+        convert_trac_username(origname, is_mention)
+    return True
+
 def trac2markdown(text, base_path, conv_help, multilines=default_multilines):
+    """
+    Convert Trac wiki markup to GitHub markdown, reusing the result of an equal
+    ticket text converted recently or cached in conversion_cache.
+    """
+    global username_lookups
+    if not isinstance(conv_help, IssuesConversionHelper):
+        # wiki pages are converted once, recording their headings as they go
+        return _trac2markdown(text, base_path, conv_help, multilines)
+
+    key = conversion_key(text, base_path, conv_help, multilines)
+    cached = conversion_memo.pop(key, None)
+    if cached is not None and not replay_username_lookups(cached[1]):
+        cached = None
+    if cached is None and conversion_cache is not None:
+        cached = conversion_cache.get(key, retry=True)
+        if cached is not None:
+            if replay_username_lookups(cached[1]):
+                cache_stats.add('trac2markdown', hits=1, bytes_read=MeasuringDisk.last_fetched())
+            else:
+                cached = None
+    if cached is None:
+        start = monotonic()
+        username_lookups = []
+        try:
+            cached = _trac2markdown(text, base_path, conv_help, multilines), username_lookups
+        finally:
+            username_lookups = None
+        if conversion_cache is not None:
+            conversion_cache.set(key, cached, retry=True)
+            cache_stats.add('trac2markdown', misses=1, miss_seconds=monotonic() - start,
+                            bytes_written=MeasuringDisk.last_stored())
+    conversion_memo[key] = cached
+    if len(conversion_memo) > conversion_memo_size:
+        conversion_memo.popitem(last=False)
+    return cached[0]
+
+def _trac2markdown(text, base_path, conv_help, multilines):
+    source_path = os.path.relpath('/tree/master/', base_path)
+
     # conversion of url
     text = trac_url_conv_help.sub(text)
     text = cgit_conv_help.sub(text)
@@ -918,7 +1206,7 @@ def trac2markdown(text, base_path, conv_help, multilines=default_multilines):
                 in_code_n += 1
 
         # CamelCase wiki link
-        if not (in_code or in_html or in_td):
+        if not (in_code or in_html or in_td) and RE_CAMELCASE_TRIGGER.search(line):
             new_line = ''
             depth = 0
             start = 0
@@ -946,91 +1234,92 @@ def trac2markdown(text, base_path, conv_help, multilines=default_multilines):
             line = new_line
 
         if not (in_code or in_html):
+            # each family of rules only runs if the line, as converted so far,
+            # contains a string that all its matches contain
             # heading
-            line = re.sub(r'^(\s*)# ', r'\1\# ', line)  # first fix unintended heading
-            line = RE_HEADING1.sub(heading_replace, line)
-            line = RE_HEADING2.sub(heading_replace, line)
-            line = RE_HEADING3.sub(heading_replace, line)
-            line = RE_HEADING4.sub(heading_replace, line)
-            line = RE_HEADING5.sub(heading_replace, line)
-            line = RE_HEADING6.sub(heading_replace, line)
-            line = RE_HEADING1a.sub(heading_replace, line)
-            line = RE_HEADING2a.sub(heading_replace, line)
-            line = RE_HEADING3a.sub(heading_replace, line)
-            line = RE_HEADING4a.sub(heading_replace, line)
-            line = RE_HEADING5a.sub(heading_replace, line)
-            line = RE_HEADING6a.sub(heading_replace, line)
+            if '# ' in line:
+                line = re.sub(r'^(\s*)# ', r'\1\# ', line)  # first fix unintended heading
+            if line.startswith('='):
+                line = RE_HEADING1.sub(heading_replace, line)
+                line = RE_HEADING2.sub(heading_replace, line)
+                line = RE_HEADING3.sub(heading_replace, line)
+                line = RE_HEADING4.sub(heading_replace, line)
+                line = RE_HEADING5.sub(heading_replace, line)
+                line = RE_HEADING6.sub(heading_replace, line)
+                line = RE_HEADING1a.sub(heading_replace, line)
+                line = RE_HEADING2a.sub(heading_replace, line)
+                line = RE_HEADING3a.sub(heading_replace, line)
+                line = RE_HEADING4a.sub(heading_replace, line)
+                line = RE_HEADING5a.sub(heading_replace, line)
+                line = RE_HEADING6a.sub(heading_replace, line)
 
             # code surrounded by underline, mistaken as italics by github
-            line = RE_UNDERLINED_CODE1.sub(r'`_\1_`', line)
-            line = RE_UNDERLINED_CODE2.sub(r'`_\1_`', line)
-            line = RE_UNDERLINED_CODE3.sub(r'`_\1_`', line)
+            if '_' in line:
+                line = RE_UNDERLINED_CODE1.sub(r'`_\1_`', line)
+                line = RE_UNDERLINED_CODE2.sub(r'`_\1_`', line)
+                line = RE_UNDERLINED_CODE3.sub(r'`_\1_`', line)
 
             # code snippet
-            line = RE_CODE_SNIPPET.sub(inline_code_snippet, line)
-
-            line = RE_SUPERSCRIPT1.sub(r'<sup>\1</sup>', line)  # superscript ^abc^
-            line = RE_SUBSCRIPT1.sub(r'<sub>\1</sub>', line)  # subscript ,,abc,,
-
-            line = RE_QUERY1.sub(r'[%s?' % trac_url_query, line) # preconversion to URL format
-            line = RE_HTTPS1.sub(conv_help.wiki_link, line)
-            line = RE_HTTPS2.sub(conv_help.wiki_link, line)  # link without display text
-            line = RE_HTTPS3.sub(conv_help.wiki_link, line)
-            line = RE_HTTPS4.sub(conv_help.wiki_link, line)
-
-            line = RE_IMAGE1.sub(conv_help.image_link_under_tree, line)
-            line = RE_IMAGE2.sub(conv_help.image_link, line)
-            line = RE_IMAGE3.sub(conv_help.image_link, line)
-            line = RE_IMAGE4.sub(r'<img src="\1" \2>', line)
-            line = RE_IMAGE5.sub(conv_help.wiki_image, line)  # \2 is image width
-            line = RE_IMAGE6.sub(conv_help.image_link, line)  # \2 is image width, \3 is alignment
-
-            line = RE_TICKET_COMMENT1.sub(conv_help.ticket_comment_link, line)
-            line = RE_TICKET_COMMENT2.sub(conv_help.ticket_comment_link, line)
-            line = RE_TICKET_COMMENT3.sub(conv_help.ticket_comment_link, line)
-            line = RE_TICKET_COMMENT4.sub(conv_help.ticket_comment_link, line)
-            line = RE_TICKET_COMMENT5.sub(conv_help.ticket_comment_link, line)
-            line = RE_TICKET_COMMENT6.sub(conv_help.ticket_comment_link, line)
-
-            line = RE_COMMENT1.sub(conv_help.comment_link, line)
-            line = RE_COMMENT2.sub(conv_help.comment_link, line)
-            line = RE_COMMENT3.sub(conv_help.comment_link, line)
-            line = RE_COMMENT4.sub(conv_help.comment_link, line)
-
-            line = RE_ATTACHMENT1.sub(conv_help.attachment, line)
-            line = RE_ATTACHMENT2.sub(conv_help.attachment, line)
-            line = RE_ATTACHMENT3.sub(conv_help.attachment, line)
-            line = RE_ATTACHMENT4.sub(conv_help.attachment, line)
-            line = RE_ATTACHMENT5.sub(conv_help.attachment, line)
-            line = RE_ATTACHMENT6.sub(conv_help.attachment, line)
-            line = RE_ATTACHMENT7.sub(conv_help.attachment, line)
-            line = RE_ATTACHMENT8.sub(conv_help.attachment, line)
-
-            if in_table:
-                line = RE_LINEBREAK1.sub('<br>', line)
-                line = RE_LINEBREAK2.sub('<br>', line)
-            else:
-                line = RE_LINEBREAK1.sub('\n', line)
-                line = RE_LINEBREAK2.sub('\n', line)
+            if '{{{' in line:
+                line = RE_CODE_SNIPPET.sub(inline_code_snippet, line)
+
+            if '^' in line:
+                line = RE_SUPERSCRIPT1.sub(r'<sup>\1</sup>', line)  # superscript ^abc^
+            if ',,' in line:
+                line = RE_SUBSCRIPT1.sub(r'<sub>\1</sub>', line)  # subscript ,,abc,,
+
+            if '[' in line:
+                line = RE_QUERY1.sub(r'[%s?' % trac_url_query, line) # preconversion to URL format
+                if '[http' in line:
+                    line = RE_HTTPS.sub(conv_help.wiki_link, line)
+
+                if '[[Image(' in line:
+                    line = RE_IMAGE.sub((conv_help.image_link_under_tree,
+                                       conv_help.image_link,
+                                       conv_help.image_link,
+                                       r'<img src="\1" \2>',
+                                       conv_help.wiki_image,  # \2 is image width
+                                       conv_help.image_link),  # \2 is image width, \3 is alignment
+                                      line)
+
+            if 'ticket:' in line:
+                line = RE_TICKET_COMMENT.sub(conv_help.ticket_comment_link, line)
+
+            if 'comment:' in line:
+                line = RE_COMMENT.sub(conv_help.comment_link, line)
+
+            if 'attachment:' in line:
+                line = RE_ATTACHMENT.sub(conv_help.attachment, line)
+
+            if '[' in line:
+                if in_table:
+                    line = RE_LINEBREAK1.sub('<br>', line)
+                    line = RE_LINEBREAK2.sub('<br>', line)
+                else:
+                    line = RE_LINEBREAK1.sub('\n', line)
+                    line = RE_LINEBREAK2.sub('\n', line)
 
-            line = RE_WIKI4.sub(conv_help.wiki_link, line)  # for pagenames containing whitespaces
-            line = RE_WIKI5.sub(conv_help.wiki_link, line)
-            line = RE_WIKI6.sub(conv_help.wiki_link, line)  # link without display text
-            line = RE_WIKI7.sub(conv_help.wiki_link, line)
+                line = RE_WIKI.sub(conv_help.wiki_link, line)
 
-            line = RE_SOURCE1.sub(r'[\2](%s/\1)' % os.path.relpath('/tree/master/', base_path), line)
-            line = RE_SOURCE2.sub(r'[\1](%s/\1)' % os.path.relpath('/tree/master/', base_path), line)
+            if 'source:' in line:
+                line = RE_SOURCE1.sub(r'[\2](%s/\1)' % source_path, line)
+                line = RE_SOURCE2.sub(r'[\1](%s/\1)' % source_path, line)
 
-            line = RE_BOLDTEXT1.sub(r'**\1**', line)
-            line = RE_ITALIC1.sub(r'*\1*', line)
-            line = RE_ITALIC2.sub(r'*\1*', line)
+            if "''" in line:
+                line = RE_BOLDTEXT1.sub(r'**\1**', line)
+                line = RE_ITALIC1.sub(r'*\1*', line)
+            if '//' in line:
+                line = RE_ITALIC2.sub(r'*\1*', line)
 
-            line = RE_TICKET1.sub(r' #\1', line) # replace global ticket references
-            line = RE_TICKET2.sub(conv_help.ticket_link, line)
+            if '/' in line:
+                line = RE_TICKET1.sub(r' #\1', line) # replace global ticket references
+            if '#' in line:
+                line = RE_TICKET2.sub(conv_help.ticket_link, line)
 
             # to avoid unintended github mention
-            line = RE_GITHUB_MENTION1.sub(github_mention, line)
-            line = RE_GITHUB_MENTION2.sub(github_mention, line)
+            if '@' in line:
+                line = RE_GITHUB_MENTION1.sub(github_mention, line)
+                line = RE_GITHUB_MENTION2.sub(github_mention, line)
 
             if RE_RULE.match(line):
                 if not a or not a[-1].strip():
@@ -1038,7 +1327,8 @@ def trac2markdown(text, base_path, conv_help, multilines=default_multilines):
                 else:
                     line = '\n---'
 
-            line = RE_NO_CAMELCASE.sub(r'\1', line)  # no CamelCase wiki link because of leading "!"
+            if '!' in line:
+                line = RE_NO_CAMELCASE.sub(r'\1', line)  # no CamelCase wiki link because of leading "!"
 
             # convert a trac table to a github table
             if line.startswith('||'):
@@ -1140,34 +1430,32 @@ def trac2markdown(text, base_path, conv_help, multilines=default_multilines):
                 elif t == 'i':
                     line = line.replace('i', toRoman(c).lower(), 1)
 
-            # take care of line break "\\", which often occurs in code snippets
-            l = len(line)
-            new_line = ''
-            start = 0
-            inline_code = False
-            for i in range(l + 1):
-                if i == l or line[i] == '`':
-                    end = i
-                    part = line[start:end]
-                    if not inline_code:
-                        if in_table:
-                            part = RE_LINEBREAK3.sub('<br>', part)
-                        else:
-                            part = RE_LINEBREAK3.sub('\n', part)
-
-                        part = RE_WIKI1.sub(conv_help.wiki_link, part)
-                        part = RE_WIKI2.sub(conv_help.wiki_link, part)
-                        part = RE_WIKI3.sub(conv_help.wiki_link, part)
-                        part = RE_WIKI31.sub(conv_help.wiki_link, part)
-
-                    new_line += part
-                    start = end
-                    if i < l and line[i] == '`':
+            if '[' in line or '\\\\' in line:
+                # take care of line break "\\", which often occurs in code snippets
+                l = len(line)
+                new_line = ''
+                start = 0
+                inline_code = False
+                for i in range(l + 1):
+                    if i == l or line[i] == '`':
+                        end = i
+                        part = line[start:end]
                         if not inline_code:
-                            inline_code = True
-                        else:
-                            inline_code = False
-            line = new_line
+                            if in_table:
+                                part = RE_LINEBREAK3.sub('<br>', part)
+                            else:
+                                part = RE_LINEBREAK3.sub('\n', part)
+
+                            part = RE_WIKI_BRACKETS.sub(conv_help.wiki_link, part)
+
+                        new_line += part
+                        start = end
+                        if i < l and line[i] == '`':
+                            if not inline_code:
+                                inline_code = True
+                            else:
+                                inline_code = False
+                line = new_line
 
         # only for table with td blocks:
         if in_table:
@@ -1260,7 +1548,7 @@ class WikiConversionHelper:
         """
         The Python constructor collects all the necessary information.
         """
-        pagenames = source.wiki.getAllPages()
+        pagenames = get_all_wiki_pages(source)
         pagenames_splitted = []
         for p in pagenames:
             pagenames_splitted += p.split('/')
@@ -1268,6 +1556,7 @@ class WikiConversionHelper:
 
         self._pagenames_splitted = pagenames_splitted
         self._pagenames_not_splitted = pagenames_not_splitted
+        self.pagenames_digest = hashlib.sha256('\n'.join(sorted(pagenames)).encode('utf-8')).hexdigest()
         self._attachment_path = ''
 
     def set_wikipage_paths(self, pagename):
@@ -1859,7 +2148,7 @@ def gh_create_attachment(dest, issue, filename, src_ticket_id, attachment=None,
                     # Here we are stricter than what mime_type_allowed_extensions allows.
                     # Replace by a gzipped file
                     if attachment:
-                        attachment['attachment'] = gzip.compress(attachment['attachment'])
+                        attachment['gzip'] = True
                     filename += ".gz"
                     mimetype = 'application/gzip'
                     logging.info(f'Replaced by {filename=} {mimetype=}')
@@ -1910,6 +2199,33 @@ def gh_create_attachment(dest, issue, filename, src_ticket_id, attachment=None,
         note = 'Attachment'
     return a, local_filename, note
 
+# Errors of downloading an attachment or of reading its contents, after which
+# it is skipped
+attachment_errors = (client.Error, OSError, http.client.HTTPException, ExpatError)
+
+def open_downloaded_attachment(download, description):
+    """
+    Wait for the ``download`` of an attachment and open its contents for
+    reading, or log a warning and return ``None`` if this fails.
+    """
+    try:
+        return download.result()()
+    except attachment_errors as e:
+        log.warning(f'Skipping attachment {description}: {getattr(e, "faultString", e)}')
+        return None
+
+def copy_attachment(src, local_filename, compress=False):
+    """
+    Copy the contents of the downloaded attachment opened as ``src`` to
+    ``local_filename``, optionally gzipping it, and close ``src``.
+    """
+    with src, open(local_filename, 'wb') as dst:
+        if compress:
+            with gzip.GzipFile(filename='', mode='wb', fileobj=dst) as gz:
+                shutil.copyfileobj(src, gz)
+        else:
+            shutil.copyfileobj(src, dst)
+
 minimized_issue_comments = []
 local_filenames = dict()  # local_filename -> comment_id
 def gh_comment_issue(dest, issue, comment, src_ticket_id, comment_id=None, minimize=True):
@@ -1917,6 +2233,10 @@ def gh_comment_issue(dest, issue, comment, src_ticket_id, comment_id=None, minim
     attachments = comment.pop('attachments', [])
     # upload attachments, if there are any
     for attachment in attachments:
+        src = open_downloaded_attachment(attachment['attachment_file'],
+                                         f"{attachment['attachment_name']} of ticket #{src_ticket_id}")
+        if src is None:
+            continue
         a, local_filename, note = gh_create_attachment(dest, issue, attachment['attachment_name'],
                                                        src_ticket_id, attachment, comment=comment)
         # write attachment data to binary file
@@ -1924,7 +2244,8 @@ def gh_comment_issue(dest, issue, comment, src_ticket_id, comment_id=None, minim
             logging.warning(f'Overwriting attachment {local_filename} with a new version')
         else:
             local_filenames[local_filename] = comment_id
-        open(local_filename, 'wb').write(attachment['attachment'])
+        copy_attachment(src, local_filename,
+                        compress=attachment.get('gzip', False))
         if preamble:
             preamble += '\n\n'
         preamble += note
@@ -2038,22 +2359,26 @@ def gh_update_issue_property(dest, issue, key, val, oldval=None, **kwds):
 
 unmapped_users = defaultdict(lambda: 0)
 
-def convert_trac_username(origname, is_mention=False):
+def map_trac_username(origname, is_mention=False):
+    """
+    Return the GitHub user name for a Trac user name, or ``None``, and the key
+    in unmapped_users to count it by if it is a mannequin.
+    """
     if origname in ignored_values:
-        return None
+        return None, None
     if is_mention and origname in ignored_mentions:
-        return None
+        return None, None
     if origname in ignored_names:
-        return None
+        return None, None
     origname = origname.strip('\u200b').rstrip('.')
     if origname.startswith('gh-'):
-        return origname[3:]
+        return origname[3:], None
     if origname.startswith('github/'):
         # example: https://trac.sagemath.org/ticket/17999
-        return origname[7:]
+        return origname[7:], None
     if origname.startswith('gh:'):
         # example: https://trac.sagemath.org/ticket/24876
-        return origname[3:]
+        return origname[3:], None
     try:
         gh_name = users_map[origname]
     except KeyError:
@@ -2063,23 +2388,29 @@ def convert_trac_username(origname, is_mention=False):
             # heuristic pattern for valid Trac account name (not an email address or full name or junk)
             pass
         else:
-            return None
+            return None, None
         gh_name = False
     else:
         if gh_name:
-            return gh_name
+            return gh_name, None
     # create mannequin user
     username = origname.replace('.', '-').replace('_', '-').strip('-')
     username = f'{unknown_users_prefix}{username}'
     if is_mention and not username in gh_users:
-        return None
-    key = (origname, gh_name is not False, is_mention, '@' + username)
-    if not unmapped_users[key]:
-        if is_mention:
-            logging.info(f'Unmapped @ mention of {origname}')
-        else:
-            logging.info(f'Unmapped Trac user {origname}')
-    unmapped_users[key] += 1
+        return None, None
+    return username, (origname, gh_name is not False, is_mention, '@' + username)
+
+def convert_trac_username(origname, is_mention=False):
+    username, key = map_trac_username(origname, is_mention)
+    if key:
+        if not unmapped_users[key]:
+            if is_mention:
+                logging.info(f'Unmapped @ mention of {key[0]}')
+            else:
+                logging.info(f'Unmapped Trac user {key[0]}')
+        unmapped_users[key] += 1
+    if username_lookups is not None:
+        username_lookups.append((origname, is_mention, username))
     return username
 
 def gh_username(dest, origname):
@@ -2136,50 +2467,698 @@ def gh_username_list(dest, orignames, ignore=['somebody', 'tbd', 'tdb', 'tba']):
             names.append(name)
     return ', '.join(names)
 
-@cache.memoize(ignore=[0, 'source'])
+@memoize(cache, cache_stats, ignore=[0, 'source'])
 def get_all_milestones(source):
     return source.ticket.milestone.getAll()
 
-@cache.memoize(ignore=[0, 'source'])
+@memoize(cache, cache_stats, ignore=[0, 'source'])
 def get_milestone(source, milestone_name):
     return source.ticket.milestone.get(milestone_name)
 
-@cache.memoize(ignore=[0, 'source'])
+@memoize(cache, cache_stats, ignore=[0, 'source'])
+def get_ticket_ids(source, filter_issues):
+    return source.ticket.query(filter_issues)
+
+@memoize(cache, cache_stats, ignore=[0, 'source'])
+def get_ticket(source, src_ticket_id):
+    return source.ticket.get(src_ticket_id)
+
+@memoize(cache, cache_stats, ignore=[0, 'source'])
 def get_changeLog(source, src_ticket_id):
-    while True:
-        try:
-            if sleep_before_xmlrpc:
-                sleep(sleep_before_xmlrpc)
-            return source.ticket.changeLog(src_ticket_id)
-        except Exception as e:
-            print(e)
-            print('Sleeping')
-            sleep(sleep_before_xmlrpc_retry)
-            print('Retrying')
+    changetime = cached_changetime(src_ticket_id)
+    changelog = source.ticket.changeLog(src_ticket_id)
+    set_changetime_stamp(get_changeLog, src_ticket_id, changetime)
+    return changelog
 
-@cache.memoize(ignore=[0, 'source'])
+@memoize(cache, cache_stats, ignore=[0, 'source'])
 def get_ticket_attachment(source, src_ticket_id, attachment_name):
-    while True:
+    return source.ticket.getAttachment(src_ticket_id, attachment_name)
+
+@memoize(cache, cache_stats, ignore=[0, 'source'])
+def get_ticket_attachment_list(source, src_ticket_id):
+    changetime = cached_changetime(src_ticket_id)
+    attachments = source.ticket.listAttachments(src_ticket_id)
+    set_changetime_stamp(get_ticket_attachment_list, src_ticket_id, changetime)
+    return attachments
+
+@memoize(cache, cache_stats, ignore=[0, 'source'])
+def get_all_wiki_pages(source):
+    return source.wiki.getAllPages()
+
+@memoize(cache, cache_stats, ignore=[0, 'source'])
+def get_wiki_page_info(source, pagename):
+    return source.wiki.getPageInfo(pagename)
+
+@memoize(cache, cache_stats, ignore=[0, 'source'])
+def get_wiki_page(source, pagename):
+    return source.wiki.getPage(pagename)
+
+@memoize(cache, cache_stats, ignore=[0, 'source'])
+def get_wiki_attachment_list(source, pagename):
+    return source.wiki.listAttachments(pagename)
+
+# Cached data of a ticket other than the ticket itself, which are stamped with
+# the changetime of the ticket
+stamped_getters = (get_changeLog, get_ticket_attachment_list)
+
+def changetime_stamp_key(getter, src_ticket_id):
+    "Key in ``trac_cache`` of the changetime stamp of the cached result of ``getter``"
+    return ('changetime', getter.__name__, src_ticket_id)
+
+def cached_changetime(src_ticket_id):
+    """
+    Return the ``changetime`` of the cached ticket, or ``None`` if it is not cached.
+
+    Read before fetching other data of the ticket, it is a changetime of the
+    ticket that these data are not older than.
+    """
+    ticket = cache.get(get_ticket.__cache_key__(None, src_ticket_id))
+    if ticket is None:
+        return None
+    return ticket[2]
+
+def set_changetime_stamp(getter, src_ticket_id, changetime):
+    "Record that the cached result of ``getter`` is as of ``changetime`` (``None`` if unknown)"
+    key = changetime_stamp_key(getter, src_ticket_id)
+    if changetime is None:
+        cache.delete(key, retry=True)
+    else:
+        cache.set(key, changetime, retry=True)
+
+class MultiCallBatcher:
+    """
+    Fill the cache of a memoized getter for many arguments at once by grouping
+    the XML-RPC calls into ``client.MultiCall`` requests.
+
+    Each result is stored under the ``cache.memoize`` key of the getter, so that
+    subsequent calls of the getter are cache hits. The batch size adapts to the
+    measured latency and payload size of the responses.
+    """
+    def __init__(self, getter, method, batch_size=multicall_batch_size):
+        self._getter = getter
+        self._method = method
+        self._stamped = getter in stamped_getters
+        self.batch_size = max(1, batch_size)
+        self._lock = threading.Lock()
+
+    def is_cached(self, *args):
+        return self._getter.__cache_key__(None, *args) in cache
+
+    def fetch(self, source, args_list):
+        """
+        Fetch the results for all argument tuples in ``args_list`` that are not cached yet.
+
+        Calls that fail are not cached; the getter fetches them again individually.
+        """
+        missing = [args for args in args_list if not self.is_cached(*args)]
+        if missing and isinstance(source, OfflineSource):
+            # the getter raises the faults recorded for the others again
+            missing = [args for args in missing if fault_key(self._method, args) not in cache]
+            if missing:
+                raise CacheMiss(f'{self._method}{missing[0]}')
+            return
+        while missing:
+            batch_size = self.batch_size
+            batch, missing = missing[:batch_size], missing[batch_size:]
+            if batch_size == 1:
+                # nothing to group
+                try:
+                    self._getter(source, *batch[0])
+                except client.Fault as e:
+                    log.warning(f'{self._method}{batch[0]}: {e.faultString}')
+                    record_fault(self._method, batch[0], e)
+                continue
+            self._fetch_batch(source, batch)
+
+    def _fetch_batch(self, source, batch):
+        changetimes = [cached_changetime(args[0]) if self._stamped else None for args in batch]
+        call = client.MultiCall(source)
+        for args in batch:
+            functools.reduce(getattr, self._method.split('.'), call)(*args)
+        start = monotonic()
         try:
-            return source.ticket.getAttachment(src_ticket_id, attachment_name)
+            results = call().results
         except Exception as e:
-            print(e)
-            print('Sleeping')
-            sleep(sleep_before_xmlrpc_retry)
-            print('Retrying')
-
-@cache.memoize()
-def get_all_tickets(filter_issues):
-    call = client.MultiCall(source)
-    for ticket in source.ticket.query(filter_issues):
-        call.ticket.get(ticket)
-    return call()
+            log.warning(f'MultiCall of {len(batch)} x {self._method} failed: {e}')
+            self._adapt(multicall_target_latency, multicall_max_payload)
+            return
+        latency = monotonic() - start
+        cache_stats.add(self._getter.__name__, prefetch_seconds=latency)
+        payload = 0
+        for args, changetime, result in zip(batch, changetimes, results):
+            if isinstance(result, dict):
+                # a fault struct
+                log.warning(f'{self._method}{args}: {result.get("faultString")}')
+                record_fault(self._method, args, client.Fault(result.get('faultCode'), result.get('faultString')))
+                continue
+            value = result[0]
+            payload += len(repr(value))
+            cache.set(self._getter.__cache_key__(None, *args), value, retry=True)
+            bytes_written = MeasuringDisk.last_stored()
+            if self._stamped:
+                set_changetime_stamp(self._getter, args[0], changetime)
+            cache_stats.add(self._getter.__name__, prefetched=1, bytes_written=bytes_written)
+        log.debug(f'MultiCall of {len(batch)} x {self._method}: {latency:.2f}s, {payload} bytes')
+        self._adapt(latency, payload)
+
+    def _adapt(self, latency, payload):
+        with self._lock:
+            if latency >= multicall_target_latency or payload >= multicall_max_payload:
+                self.batch_size = max(1, self.batch_size // 2)
+            elif latency < multicall_target_latency / 2 and payload < multicall_max_payload / 2:
+                self.batch_size = min(multicall_max_batch_size, self.batch_size * 2)
+
+ticket_batcher = MultiCallBatcher(get_ticket, 'ticket.get')
+changelog_batcher = MultiCallBatcher(get_changeLog, 'ticket.changeLog')
+attachment_list_batcher = MultiCallBatcher(get_ticket_attachment_list, 'ticket.listAttachments')
+milestone_batcher = MultiCallBatcher(get_milestone, 'ticket.milestone.get')
+wiki_page_info_batcher = MultiCallBatcher(get_wiki_page_info, 'wiki.getPageInfo')
+wiki_page_batcher = MultiCallBatcher(get_wiki_page, 'wiki.getPage')
+wiki_attachment_list_batcher = MultiCallBatcher(get_wiki_attachment_list, 'wiki.listAttachments')
+
+rpc_scheduler = RpcScheduler(max_rate=requests_per_second or None,
+                             max_retries=max_retries if max_retries >= 0 else None,
+                             breaker_threshold=breaker_threshold,
+                             breaker_cooldown=breaker_cooldown,
+                             max_concurrent=max(1, max_concurrent_requests))
+
+# Persistent connections to the Trac server shared by all threads, one more
+# than the workers for the thread fetching pages of tickets
+trac_transport = pooled_transport(trac_url, max_connections=max_concurrent_requests + 1)
+
+def fault_key(method, args):
+    "Key in ``trac_cache`` of the fault that Trac returned for a call"
+    return ('fault', method, tuple(args))
+
+def record_fault(method, args, fault):
+    """
+    Keep the fault that Trac returned for a call, such as a missing ticket or
+    wiki page, to raise it again in offline mode.
+    """
+    cache.set(fault_key(method, args), (fault.faultCode, fault.faultString), retry=True)
+
+class CacheMiss(LookupError):
+    "The result of a call to Trac is not in ``trac_cache`` in offline mode"
+
+class OfflineSource:
+    """
+    Stand-in for the proxy of the Trac instance in offline mode, which raises
+    the fault recorded for a call, or :class:`CacheMiss`. It is only called
+    for results that are not in ``trac_cache``.
+    """
+    def __init__(self, name=None):
+        self._name = name
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return OfflineSource(f'{self._name}.{name}' if self._name else name)
+
+    def __call__(self, *args):
+        fault = cache.get(fault_key(self._name, args))
+        if fault is not None:
+            raise client.Fault(*fault)
+        raise CacheMiss(f'{self._name}{args}')
+
+def make_source():
+    """
+    Return a new proxy for the Trac instance using the configured backend.
+    """
+    if offline:
+        return OfflineSource()
+    proxy = ScheduledServerProxy(trac_url, rpc_scheduler, transport=trac_transport)
+    if source_backend == 'database':
+        return TracDatabaseSource(trac_env_path, fallback=proxy)
+    return proxy
+
+_thread_local = threading.local()
+def thread_source():
+    """
+    Return a proxy for the Trac instance that is owned by the calling thread.
+
+    The XML-RPC proxies share the connections of ``trac_transport``, but database
+    connections must not be shared between threads.
+    """
+    try:
+        return _thread_local.source
+    except AttributeError:
+        _thread_local.source = make_source()
+        return _thread_local.source
+
+def thread_attachment_source(filename):
+    """
+    Return an XML-RPC proxy owned by the calling thread that writes the
+    binary data of the next response to ``filename`` instead of returning it.
+    """
+    try:
+        proxy, transport = _thread_local.attachment_source
+    except AttributeError:
+        transport = streaming_base64_transport(trac_url)
+        proxy = ScheduledServerProxy(trac_url, rpc_scheduler, transport=transport)
+        _thread_local.attachment_source = proxy, transport
+    transport.filename = filename
+    return proxy
+
+def download_ticket_attachment(src_ticket_id, attachment_name, filename):
+    """
+    Stream the attachment from Trac into the file ``filename``.
+
+    Memory use does not depend on the size of the attachment.
+    """
+    return thread_attachment_source(filename).ticket.getAttachment(src_ticket_id, attachment_name)
+
+def attachment_blob_key(realm, parent_id, attachment_name):
+    "Key in ``trac_cache`` of the digest of an attachment in ``blob_store``"
+    return ('attachment_blob', realm, parent_id, attachment_name)
+
+def download_wiki_attachment(pagename, attachment_name, filename):
+    """
+    Stream the attachment of a wiki page from Trac into the file ``filename``.
+    """
+    return thread_attachment_source(filename).wiki.getAttachment(pagename + '/' + attachment_name)
+
+class AttachmentDownloader:
+    """
+    Download ticket or wiki attachments into ``blob_store`` using a pool of
+    ``max_workers`` worker threads.
+    """
+    def __init__(self, max_workers=max_concurrent_downloads):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers),
+                                            thread_name_prefix='trac_attachment')
+        self._futures = {}  # (realm, parent_id, attachment_name) -> Future
+        self._lock = threading.Lock()
+
+    def submit(self, parent_id, attachment_name, realm='ticket'):
+        """
+        Start downloading the attachment of the ticket or wiki page ``parent_id``
+        unless this has been done already.
+
+        Return a ``Future`` whose result is a function that opens the
+        contents of the attachment for reading, downloading it again if it
+        has been dropped from ``blob_store`` meanwhile.
+        """
+        key = realm, parent_id, attachment_name
+        with self._lock:
+            try:
+                return self._futures[key]
+            except KeyError:
+                future = self._executor.submit(self._download, realm, parent_id, attachment_name)
+                self._futures[key] = future
+                return future
+
+    def _download(self, realm, parent_id, attachment_name, download_again=True):
+        if trac_env_path:
+            # no need to download what is in the Trac environment
+            filename = attachment_file(trac_env_path, realm, parent_id, attachment_name)
+            if filename:
+                return functools.partial(open, filename, 'rb')
+        key = attachment_blob_key(realm, parent_id, attachment_name)
+        digest = cache.get(key)
+        if digest is None or digest not in blob_store:
+            compress = is_compressible(attachment_name)
+            # attachments cached by earlier versions of this script
+            legacy_key = get_ticket_attachment.__cache_key__(None, parent_id, attachment_name)
+            attachment = realm == 'ticket' and cache.get(legacy_key)
+            if attachment:
+                digest = blob_store.put_bytes(attachment.data, compress=compress)
+                cache.delete(legacy_key, retry=True)
+            elif offline:
+                fault = cache.get(fault_key(f'{realm}.getAttachment', (parent_id, attachment_name)))
+                if fault is not None:
+                    raise client.Fault(*fault)
+                raise CacheMiss(f'{realm} attachment {parent_id}/{attachment_name}')
+            else:
+                filename = blob_store.temporary_filename()
+                try:
+                    if realm == 'wiki':
+                        download_wiki_attachment(parent_id, attachment_name, filename)
+                    else:
+                        download_ticket_attachment(parent_id, attachment_name, filename)
+                    digest = blob_store.put_file(filename, compress=compress)
+                except client.Fault as e:
+                    record_fault(f'{realm}.getAttachment', (parent_id, attachment_name), e)
+                    raise
+                finally:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(filename)
+            cache.set(key, digest, retry=True)
+        return functools.partial(self._open, realm, parent_id, attachment_name, digest, download_again)
+
+    def _open(self, realm, parent_id, attachment_name, digest, download_again):
+        """
+        Open the blob ``digest`` of the attachment. If it has been removed from
+        ``blob_store`` since the download, download the attachment once more.
+        """
+        try:
+            return blob_store.open(digest)
+        except BlobMissing:
+            if not download_again:
+                raise
+        log.info(f'The {realm} attachment {parent_id}/{attachment_name} was dropped from '
+                 f'blob_store, downloading it again')
+        if realm == 'ticket':
+            forget_ticket_attachment(parent_id, attachment_name)
+        else:
+            cache.delete(attachment_blob_key(realm, parent_id, attachment_name), retry=True)
+        return self._download(realm, parent_id, attachment_name, download_again=False)()
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+class TicketPrefetcher:
+    """
+    Fetch the changelogs and attachment lists of upcoming tickets into ``trac_cache``.
+
+    The calls are grouped into MultiCall requests. If ``ahead`` is positive, the
+    requests are made in the background by at most ``max_workers`` worker threads,
+    staying at most ``ahead`` tickets ahead of the conversion. The attachments
+    found in the changelogs are downloaded in the background by ``self.attachments``.
+    """
+    def __init__(self, ticket_ids, ahead=prefetch_tickets_ahead, max_workers=max_concurrent_requests):
+        self.attachments = AttachmentDownloader()
+        self._upcoming = deque(ticket_ids)
+        self._position = {ticket_id: i for i, ticket_id in enumerate(self._upcoming)}
+        self._ahead = ahead
+        self._futures = {}  # src_ticket_id -> Future
+        self._executor = None
+        if ahead > 0 and max_workers > 0:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                                thread_name_prefix='trac_prefetch')
+
+    def _fetch(self, source, ticket_ids):
+        args_list = [(ticket_id,) for ticket_id in ticket_ids]
+        changelog_batcher.fetch(source, args_list)
+        attachment_list_batcher.fetch(source, args_list)
+        for src_ticket_id in ticket_ids:
+            try:
+                changelog = get_changeLog(source, src_ticket_id)
+            except client.Fault:
+                # e.g. a ticket of only_issues that does not exist in Trac,
+                # which the conversion skips; the fault is logged by the batcher
+                continue
+            self._download_attachments(src_ticket_id, changelog)
+
+    def _download_attachments(self, src_ticket_id, changelog):
+        for time, author, change_type, oldvalue, newvalue, permanent in changelog:
+            if change_type == 'attachment':
+                self.attachments.submit(src_ticket_id, newvalue)
+
+    def _next_batch(self, limit):
+        "Pop up to ``limit`` upcoming tickets whose data are not cached"
+        batch = []
+        while self._upcoming and len(batch) < limit:
+            src_ticket_id = self._upcoming.popleft()
+            if not (changelog_batcher.is_cached(src_ticket_id)
+                    and attachment_list_batcher.is_cached(src_ticket_id)):
+                batch.append(src_ticket_id)
+        return batch
+
+    def _schedule(self):
+        if len(self._futures) > self._ahead // 2:
+            # refill only when half of the window is consumed, to keep the batches large
+            return
+        while self._upcoming and len(self._futures) < self._ahead:
+            batch = self._next_batch(min(changelog_batcher.batch_size,
+                                         self._ahead - len(self._futures)))
+            if batch:
+                future = self._executor.submit(lambda batch: self._fetch(thread_source(), batch), batch)
+                for src_ticket_id in batch:
+                    self._futures[src_ticket_id] = future
+
+    def _skip_to(self, src_ticket_id):
+        "Forget about upcoming tickets that the conversion has passed over"
+        position = self._position.get(src_ticket_id)
+        if position is None:
+            return
+        while self._upcoming and self._position[self._upcoming[0]] <= position:
+            self._upcoming.popleft()
+        for ticket_id in list(self._futures):
+            if self._position[ticket_id] < position:
+                self._futures.pop(ticket_id)
+
+    def changeLog(self, source, src_ticket_id):
+        """
+        Return the changelog of the ticket, waiting for its prefetch if it is in flight.
+        """
+        self._skip_to(src_ticket_id)
+        if self._executor is None:
+            if not changelog_batcher.is_cached(src_ticket_id):
+                self._fetch(source, [src_ticket_id] + self._next_batch(changelog_batcher.batch_size - 1))
+        else:
+            future = self._futures.pop(src_ticket_id, None)
+            self._schedule()
+            if future is not None:
+                future.result()
+        changelog = get_changeLog(source, src_ticket_id)
+        self._download_attachments(src_ticket_id, changelog)
+        return changelog
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        self.attachments.close()
+
+def fetch_async(requests):
+    """
+    Fetch the uncached results of ``requests``, an iterable of triples
+    ``(getter, method, args)``, with the asyncio client and store them under
+    the keys of the memoized ``getter``.
+    """
+    getters = {}
+    changetimes = {}  # (method, args) -> changetime of the ticket when requested
+
+    def calls():
+        for getter, method, args in requests:
+            if getter.__cache_key__(None, *args) not in cache:
+                getters[method] = getter
+                if getter in stamped_getters:
+                    changetimes[method, args] = cached_changetime(args[0])
+                yield method, args
+
+    def store(method, args, result):
+        changetime = changetimes.pop((method, args), None)
+        if isinstance(result, Exception):
+            log.warning(f'{method}{args}: {result}')
+            if isinstance(result, client.Fault):
+                record_fault(method, args, result)
+        else:
+            cache.set(getters[method].__cache_key__(None, *args), result, retry=True)
+            bytes_written = MeasuringDisk.last_stored()
+            if getters[method] in stamped_getters:
+                set_changetime_stamp(getters[method], args[0], changetime)
+            cache_stats.add(getters[method].__name__, prefetched=1, bytes_written=bytes_written)
+
+    trac_xmlrpc_async.fetch(trac_url, calls(), store, concurrency=max_concurrent_requests,
+                            scheduler=rpc_scheduler)
+
+def get_all_tickets(source, ticket_ids, page_size=ticket_page_size, high_water_mark=None):
+    """
+    Generate the tickets ``ticket_ids`` as returned by ``ticket.get``.
+
+    The tickets are fetched into ``trac_cache`` page by page, the next page in
+    a background thread while the tickets of the current page are consumed.
+    ``high_water_mark`` is recorded as the high-water mark of the tickets once
+    all of them are fetched.
+    """
+    pages = [ticket_ids[i:i + page_size] for i in range(0, len(ticket_ids), page_size)]
+
+    def fetch(page):
+        ticket_batcher.fetch(thread_source(), [(src_ticket_id,) for src_ticket_id in page])
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='trac_tickets') as executor:
+        future = executor.submit(fetch, pages[0]) if pages else None
+        for i, page in enumerate(pages):
+            future.result()
+            if i + 1 < len(pages):
+                future = executor.submit(fetch, pages[i + 1])
+            for src_ticket_id in page:
+                try:
+                    ticket = get_ticket(source, src_ticket_id)
+                except client.Fault as e:
+                    log.warning(f'Skipping ticket #{src_ticket_id}: {e.faultString}')
+                    high_water_mark = None
+                    continue
+                yield ticket
+    set_tickets_high_water_mark(high_water_mark)
+
+# Keys of the high-water marks of incremental runs in ``trac_cache``
+TICKETS_HIGH_WATER_MARK = 'tickets_changed_since'
+WIKI_HIGH_WATER_MARK = 'wiki_changed_since'
+
+def latest_ticket_changetime(source):
+    """
+    Return the latest ``changetime`` of the tickets in Trac, or ``None`` if
+    there are no tickets. Taken before tickets are fetched, the changes that
+    these tickets miss are at or after it.
+    """
+    if isinstance(source, TracDatabaseSource):
+        return max(filter(None, source.changetimes().values()), default=None)
+    ticket_ids = source.ticket.query('order=changetime&desc=1&max=1')
+    if not ticket_ids:
+        return None
+    return source.ticket.get(ticket_ids[0])[2]
+
+def full_fetch_high_water_mark(source, ticket_ids):
+    """
+    Return the latest ``changetime`` in Trac if none of the tickets
+    ``ticket_ids`` is cached, so that all are about to be fetched, and ``None``
+    otherwise. Cached tickets may be older than any time Trac can tell.
+    """
+    if isinstance(source, OfflineSource):
+        return None
+    if any(ticket_batcher.is_cached(src_ticket_id) for src_ticket_id in ticket_ids):
+        return None
+    return latest_ticket_changetime(source)
+
+def set_tickets_high_water_mark(changetime):
+    """
+    Record that the cached tickets and their data miss no change before the
+    Trac time ``changetime``, unless a later time is recorded already; Trac
+    reports the changes at or after the recorded time in the next incremental run.
+    """
+    if changetime is None:
+        return
+    high_water_mark = cache.get(TICKETS_HIGH_WATER_MARK)
+    if high_water_mark is None or changetime > high_water_mark:
+        cache.set(TICKETS_HIGH_WATER_MARK, changetime, retry=True)
+
+def forget_ticket_attachment(src_ticket_id, attachment_name):
+    "Drop the downloaded copy of a ticket attachment"
+    cache.delete(get_ticket_attachment.__cache_key__(None, src_ticket_id, attachment_name), retry=True)
+    cache.delete(attachment_blob_key('ticket', src_ticket_id, attachment_name), retry=True)
+
+def refresh_changed_tickets(source):
+    """
+    Update the cached list of ticket ids and drop the cached tickets, changelogs
+    and attachment lists that are older than the ``changetime`` of their ticket
+    in Trac, together with the attachments uploaded since.
+
+    Changelogs and attachment lists carry the changetime of their ticket when
+    they were fetched; those cached by earlier versions count as fetched at the
+    high-water mark of their run. The database has the changetimes of all
+    tickets at hand, whereas over XML-RPC the tickets changed since the
+    previous run are fetched again to learn theirs.
+    """
+    high_water_mark = cache.get(TICKETS_HIGH_WATER_MARK)
+    if isinstance(source, TracDatabaseSource):
+        changetimes = source.changetimes()
+        refreshed_until = max(filter(None, changetimes.values()), default=None)
+    elif high_water_mark is None:
+        return
+    else:
+        refreshed_until = latest_ticket_changetime(source)
+        changed = [src_ticket_id for src_ticket_id in source.ticket.getRecentChanges(high_water_mark)
+                   if ticket_batcher.is_cached(src_ticket_id)
+                   or changelog_batcher.is_cached(src_ticket_id)
+                   or attachment_list_batcher.is_cached(src_ticket_id)]
+        for src_ticket_id in changed:
+            cache.delete(get_ticket.__cache_key__(None, src_ticket_id), retry=True)
+        ticket_batcher.fetch(source, [(src_ticket_id,) for src_ticket_id in changed])
+        changetimes = {src_ticket_id: cached_changetime(src_ticket_id) for src_ticket_id in changed}
+        if None in changetimes.values():
+            # the tickets that could not be fetched again are still to be refreshed
+            refreshed_until = None
+
+    key = get_ticket_ids.__cache_key__(None, filter_issues)
+    if key in cache:
+        cache.set(key, source.ticket.query(filter_issues), retry=True)
+
+    stale_tickets = []
+    stale_attachment_lists = {}  # src_ticket_id -> stamp of the dropped attachment list
+    stale = 0
+    for src_ticket_id, changetime in changetimes.items():
+        if not changetime:
+            continue
+        cached = cached_changetime(src_ticket_id)
+        if cached is not None and cached < changetime:
+            cache.delete(get_ticket.__cache_key__(None, src_ticket_id), retry=True)
+            stale_tickets.append(src_ticket_id)
+            stale += 1
+        for getter in stamped_getters:
+            key = getter.__cache_key__(None, src_ticket_id)
+            if key not in cache:
+                continue
+            stamp = cache.get(changetime_stamp_key(getter, src_ticket_id), high_water_mark)
+            if stamp is None or stamp < changetime:
+                cache.delete(key, retry=True)
+                set_changetime_stamp(getter, src_ticket_id, None)
+                stale += 1
+                if getter is get_ticket_attachment_list:
+                    stale_attachment_lists[src_ticket_id] = stamp
+    log.info(f'{stale} cached tickets, changelogs and attachment lists are out of date')
+
+    # the tickets first, for the changetime stamps of the attachment lists
+    ticket_batcher.fetch(source, [(src_ticket_id,) for src_ticket_id in stale_tickets])
+    attachment_list_batcher.fetch(source, [(src_ticket_id,) for src_ticket_id in stale_attachment_lists])
+    for src_ticket_id, since in stale_attachment_lists.items():
+        for attachment_name, _, _, time, _ in get_ticket_attachment_list(source, src_ticket_id):
+            # an upload replaces an attachment of the same name
+            if since is None or (time and time >= since):
+                forget_ticket_attachment(src_ticket_id, attachment_name)
+    set_tickets_high_water_mark(refreshed_until)
+
+def refresh_milestones(source):
+    """
+    Drop the cached milestones. There is no way to ask Trac for the changed
+    ones, but they are few and fetched in one MultiCall.
+    """
+    key = get_all_milestones.__cache_key__(None)
+    for milestone_name in cache.get(key, ()):
+        cache.delete(get_milestone.__cache_key__(None, milestone_name), retry=True)
+    cache.delete(key, retry=True)
+
+def refresh_changed_wiki_pages(source):
+    """
+    Drop the cached list of wiki pages, all attachment lists and the cached pages
+    and downloaded attachments of the pages that changed in Trac since the previous run.
+
+    Attaching a file does not change the version of a page, so an attachment
+    replaced without an edit of its page is not noticed.
+    """
+    since = cache.get(WIKI_HIGH_WATER_MARK)
+    if since is None:
+        return
+    changed = source.wiki.getRecentChanges(since)
+    log.info(f'{len(changed)} wiki pages changed since {since}')
+    for info in changed:
+        cache.delete(get_wiki_page_info.__cache_key__(None, info['name']), retry=True)
+        cache.delete(get_wiki_page.__cache_key__(None, info['name']), retry=True)
+        for attachment in cache.get(get_wiki_attachment_list.__cache_key__(None, info['name']), ()):
+            cache.delete(attachment_blob_key('wiki', info['name'], os.path.basename(attachment)), retry=True)
+    key = get_all_wiki_pages.__cache_key__(None)
+    for pagename in cache.get(key, ()):
+        cache.delete(get_wiki_attachment_list.__cache_key__(None, pagename), retry=True)
+    cache.delete(key, retry=True)
+
+def ticket_fetch_plan(source, only_issues=None, blacklist_issues=None):
+    """
+    Return the ids of the tickets to fetch and convert, in order.
+
+    With ``only_issues``, the ticket query is only run if ``filter_issues`` is
+    configured explicitly, to intersect its result with ``only_issues``.
+    """
+    if only_issues and not config.has_option('issues', 'filter_issues'):
+        ticket_ids = sorted(only_issues)
+    else:
+        ticket_ids = [src_ticket_id for src_ticket_id in get_ticket_ids(source, filter_issues)
+                      if not (only_issues and src_ticket_id not in only_issues)]
+    if blacklist_issues:
+        ticket_ids = [src_ticket_id for src_ticket_id in ticket_ids
+                      if src_ticket_id not in blacklist_issues]
+    return ticket_ids
 
 def convert_issues(source, dest, only_issues = None, blacklist_issues = None):
     conv_help = IssuesConversionHelper(source)
 
+    if incremental:
+        refresh_milestones(source)
+        refresh_changed_tickets(source)
+
     if migrate_milestones:
-        for milestone_name in get_all_milestones(source):
+        milestone_names = get_all_milestones(source)
+        milestone_batcher.fetch(source, [(milestone_name,) for milestone_name in milestone_names])
+        for milestone_name in milestone_names:
             milestone = get_milestone(source, milestone_name)
             log.debug(f'Milestone: {milestone}')
             title = milestone.pop('name')
@@ -2203,10 +3182,42 @@ def convert_issues(source, dest, only_issues = None, blacklist_issues = None):
                 milestone_map[milestone_name] = gh_create_milestone(dest, new_milestone)
                 log.debug(milestone_map[milestone_name])
 
+    ticket_ids = ticket_fetch_plan(source, only_issues, blacklist_issues)
+    high_water_mark = None
+    if not (only_issues or blacklist_issues):
+        high_water_mark = full_fetch_high_water_mark(source, ticket_ids)
+    if async_fetch and source_backend == 'xmlrpc' and not offline:
+        fetch_async((getter, method, (src_ticket_id,))
+                    for src_ticket_id in ticket_ids
+                    for getter, method in ((get_ticket, 'ticket.get'),
+                                           (get_changeLog, 'ticket.changeLog'),
+                                           (get_ticket_attachment_list, 'ticket.listAttachments')))
+    if isinstance(source, TracDatabaseSource):
+        # A single pass over the ticket_change table
+        missing = [src_ticket_id for src_ticket_id in ticket_ids
+                   if not changelog_batcher.is_cached(src_ticket_id)]
+        changetimes = {src_ticket_id: cached_changetime(src_ticket_id) for src_ticket_id in missing}
+        start = monotonic()
+        for src_ticket_id, changelog in source.changeLogs(missing):
+            cache.set(get_changeLog.__cache_key__(None, src_ticket_id), changelog, retry=True)
+            bytes_written = MeasuringDisk.last_stored()
+            set_changetime_stamp(get_changeLog, src_ticket_id, changetimes[src_ticket_id])
+            cache_stats.add('get_changeLog', prefetched=1, bytes_written=bytes_written)
+        cache_stats.add('get_changeLog', prefetch_seconds=monotonic() - start)
+    tickets = get_all_tickets(source, ticket_ids, high_water_mark=high_water_mark)
+    prefetcher = TicketPrefetcher(ticket_ids)
+    try:
+        convert_tickets(source, dest, conv_help, tickets, prefetcher,
+                        only_issues=only_issues, blacklist_issues=blacklist_issues)
+    finally:
+        tickets.close()
+        prefetcher.close()
+
+def convert_tickets(source, dest, conv_help, tickets, prefetcher, only_issues=None, blacklist_issues=None):
     nextticketid = 1
     ticketcount = 0
 
-    for src_ticket in get_all_tickets(filter_issues):
+    for src_ticket in tickets:
         src_ticket_id, time_created, time_changed, src_ticket_data = src_ticket
 
         if only_issues and src_ticket_id not in only_issues:
@@ -2236,7 +3247,7 @@ def convert_issues(source, dest, only_issues = None, blacklist_issues = None):
         # src_ticket_data.keys(): ['status', 'changetime', 'description', 'reporter', 'cc', 'type', 'milestone', '_ts',
         # 'component', 'owner', 'summary', 'platform', 'version', 'time', 'keywords', 'resolution']
 
-        changelog = get_changeLog(source, src_ticket_id)
+        changelog = prefetcher.changeLog(source, src_ticket_id)
 
         log.info('Migrating ticket #%s (%3d changes): "%s"' % (src_ticket_id, len(changelog), src_ticket_data['summary'][:50].replace('"', '\'')))
 
@@ -2566,7 +3577,7 @@ def convert_issues(source, dest, only_issues = None, blacklist_issues = None):
             }
             if change_type == "attachment":
                 # The attachment may be described in the next comment
-                attachments.append({'attachment': get_ticket_attachment(source, src_ticket_id, newvalue).data,
+                attachments.append({'attachment_file': prefetcher.attachments.submit(src_ticket_id, newvalue),
                                     'attachment_name': newvalue})
             elif change_type == "comment":
                 # oldvalue is here either x or y.x, where x is the number of this comment and y is the number of the comment that is replied to
@@ -2719,24 +3730,50 @@ def convert_issues(source, dest, only_issues = None, blacklist_issues = None):
             print ('%d tickets migrated. Waiting %d seconds to let GitHub/Trac cool down.' % (ticketcount, sleep_after_10tickets))
             sleep(sleep_after_10tickets)
 
-def convert_wiki(source, dest):
+def fetch_wiki_pages(source):
+    """
+    Fetch the infos of all wiki pages, and the texts and attachment lists of
+    the pages to convert, into ``trac_cache``. Return the names of the pages
+    to convert.
+    """
     exclude_authors = ['trac']
 
+    pagenames = get_all_wiki_pages(source)
+    wiki_page_info_batcher.fetch(source, [(pagename,) for pagename in pagenames])
+    infos = {pagename: get_wiki_page_info(source, pagename) for pagename in pagenames}
+    pagenames = [pagename for pagename in pagenames if infos[pagename]['author'] not in exclude_authors]
+    wiki_page_batcher.fetch(source, [(pagename,) for pagename in pagenames])
+    wiki_attachment_list_batcher.fetch(source, [(pagename,) for pagename in pagenames])
+
+    last_modified = max((info['lastModified'] for info in infos.values()), default=None)
+    if last_modified is not None:
+        cache.set(WIKI_HIGH_WATER_MARK, last_modified, retry=True)
+    return pagenames
+
+def convert_wiki(source, dest):
     if not os.path.isdir(wiki_export_dir):
         os.makedirs(wiki_export_dir)
 
-    client.MultiCall(source)
+    if incremental:
+        refresh_changed_wiki_pages(source)
     conv_help = WikiConversionHelper(source)
 
     if os.path.exists('links.txt'):
         os.remove('links.txt')
 
-    for pagename in source.wiki.getAllPages():
-        info = source.wiki.getPageInfo(pagename)
-        if info['author'] in exclude_authors:
-            continue
+    pagenames = fetch_wiki_pages(source)
+    downloader = AttachmentDownloader()
+    try:
+        downloads = {pagename: [(attachment, downloader.submit(pagename, os.path.basename(attachment), realm='wiki'))
+                                for attachment in get_wiki_attachment_list(source, pagename)]
+                     for pagename in pagenames}
+        convert_wiki_pages(source, conv_help, pagenames, downloads)
+    finally:
+        downloader.close()
 
-        page = source.wiki.getPage(pagename)
+def convert_wiki_pages(source, conv_help, pagenames, downloads):
+    for pagename in pagenames:
+        page = get_wiki_page(source, pagename)
         print ("Migrate Wikipage", pagename)
 
         # Github wiki does not have folder structure
@@ -2746,16 +3783,17 @@ def convert_wiki(source, dest):
         converted = trac2markdown(page, os.path.dirname('/wiki/%s' % gh_pagename), conv_help)
 
         attachments = []
-        for attachment in source.wiki.listAttachments(pagename):
+        for attachment, download in downloads[pagename]:
             print ("  Attachment", attachment)
             attachmentname = os.path.basename(attachment)
-            attachmentdata = source.wiki.getAttachment(attachment).data
 
+            src = open_downloaded_attachment(download, attachment)
+            if src is None:
+                continue
             dirname = os.path.join(wiki_export_dir, gh_pagename)
             if not os.path.isdir(dirname):
                 os.makedirs(dirname)
-            # write attachment data to binary file
-            open(os.path.join(dirname, attachmentname), 'wb').write(attachmentdata)
+            copy_attachment(src, os.path.join(dirname, attachmentname))
             attachmenturl = gh_pagename + '/' + attachmentname
 
             converted = re.sub(r'\[attachment:%s\s([^\[\]]+)\]' % re.escape(attachmentname), r'[\1](%s)' % attachmenturl, converted)
@@ -2780,6 +3818,86 @@ def convert_wiki(source, dest):
             print ('  Retrying with UTF-8 encoding')
             codecs.open(outfile, 'w', 'utf-8').write(converted)
 
+def prefetch(source):
+    """
+    Fetch everything that the conversion of milestones, tickets and wiki pages
+    needs from Trac into ``trac_cache`` and ``blob_store``,
+    without converting anything, and show the progress.
+    """
+    if incremental:
+        refresh_milestones(source)
+        refresh_changed_tickets(source)
+        refresh_changed_wiki_pages(source)
+
+    downloader = AttachmentDownloader()
+    downloads = set()
+    downloads_lock = threading.Lock()
+    columns = (*Progress.get_default_columns(), MofNCompleteColumn())
+    with Progress(*columns) as progress:
+        attachments_task = progress.add_task('Attachments', total=0)
+
+        def download(parent_id, attachment_name, realm='ticket'):
+            future = downloader.submit(parent_id, attachment_name, realm=realm)
+            with downloads_lock:
+                if future in downloads:
+                    return
+                downloads.add(future)
+                progress.update(attachments_task, total=len(downloads))
+            future.add_done_callback(lambda future: progress.advance(attachments_task))
+
+        # the conversion of tickets also needs the names of the wiki pages
+        get_all_wiki_pages(source)
+
+        if must_convert_issues:
+            if migrate_milestones:
+                milestone_names = get_all_milestones(source)
+                milestone_batcher.fetch(source, [(milestone_name,) for milestone_name in milestone_names])
+            ticket_ids = ticket_fetch_plan(source, only_issues, blacklist_issues)
+            high_water_mark = None
+            if not (only_issues or blacklist_issues):
+                high_water_mark = full_fetch_high_water_mark(source, ticket_ids)
+            tickets_task = progress.add_task('Tickets', total=len(ticket_ids))
+            if async_fetch and source_backend == 'xmlrpc' and not offline:
+                fetch_async((getter, method, (src_ticket_id,))
+                            for src_ticket_id in ticket_ids
+                            for getter, method in ((get_ticket, 'ticket.get'),
+                                                   (get_changeLog, 'ticket.changeLog'),
+                                                   (get_ticket_attachment_list, 'ticket.listAttachments')))
+
+            def fetch_page(page):
+                source = thread_source()
+                args_list = [(src_ticket_id,) for src_ticket_id in page]
+                ticket_batcher.fetch(source, args_list)
+                changelog_batcher.fetch(source, args_list)
+                attachment_list_batcher.fetch(source, args_list)
+                for src_ticket_id in page:
+                    if changelog_batcher.is_cached(src_ticket_id):
+                        for _, _, change_type, _, newvalue, _ in get_changeLog(source, src_ticket_id):
+                            if change_type == 'attachment':
+                                download(src_ticket_id, newvalue)
+                    progress.advance(tickets_task)
+
+            pages = [ticket_ids[i:i + ticket_page_size] for i in range(0, len(ticket_ids), ticket_page_size)]
+            with ThreadPoolExecutor(max_workers=max(1, max_concurrent_requests),
+                                    thread_name_prefix='trac_prefetch') as executor:
+                for future in [executor.submit(fetch_page, page) for page in pages]:
+                    future.result()
+            if all(ticket_batcher.is_cached(src_ticket_id) for src_ticket_id in ticket_ids):
+                set_tickets_high_water_mark(high_water_mark)
+
+        if must_convert_wiki:
+            wiki_task = progress.add_task('Wiki pages', total=None)
+            pagenames = fetch_wiki_pages(source)
+            for pagename in pagenames:
+                for attachment in get_wiki_attachment_list(source, pagename):
+                    download(pagename, os.path.basename(attachment), realm='wiki')
+            progress.update(wiki_task, total=len(pagenames), completed=len(pagenames))
+
+        for future in concurrent.futures.as_completed(downloads):
+            if future.exception():
+                log.warning(f'Attachment download failed: {future.exception()}')
+    downloader.close()
+
 def output_unmapped_users(data):
     table = Table(title="Unmapped users")
     table.add_column("Username", justify="right", style="cyan", no_wrap=True)
@@ -2855,6 +3973,29 @@ def output_component_frequency(data):
             for key, frequency in data:
                 f.write(' '.join([key, str(frequency)]) +'\n')
 
+def output_cache_statistics(data):
+    table = Table(title="Cache statistics")
+    table.add_column("Function", justify="right", style="cyan", no_wrap=True)
+    table.add_column("Hits", justify="right", style="magenta")
+    table.add_column("Misses", justify="right", style="magenta")
+    table.add_column("Prefetched", justify="right", style="magenta")
+    table.add_column("Read (MB)", justify="right", style="magenta")
+    table.add_column("Written (MB)", justify="right", style="magenta")
+    table.add_column("Miss latency (s)", justify="right", style="magenta")
+    table.add_column("Prefetch time (s)", justify="right", style="magenta")
+
+    for name, counters in data.items():
+        table.add_row(name, str(counters['hits']), str(counters['misses']), str(counters['prefetched']),
+                      f"{counters['bytes_read'] / 1e6:.2f}", f"{counters['bytes_written'] / 1e6:.2f}",
+                      f"{counters['mean_miss_seconds']:.3f}", f"{counters['prefetch_seconds']:.1f}")
+
+    console = Console()
+    console.print(table)
+
+    # Unlike the other reports, this describes only the latest run
+    with open('cache_statistics.json', 'w') as f:
+        json.dump(data, f, indent=4)
+
 if __name__ == "__main__":
 
     from rich.logging import RichHandler
@@ -2863,7 +4004,23 @@ if __name__ == "__main__":
         level="INFO", format=FORMAT, datefmt="[%X]", handlers=[RichHandler()]
     )
 
-    source = client.ServerProxy(trac_url)
+    # without the credentials that the URL may contain
+    trac_host = urlparse(trac_url).hostname
+    if command == 'export-cache':
+        export_snapshot(cache, blob_store, snapshot_filename, trac_host=trac_host)
+        sys.exit()
+    if command == 'import-cache':
+        manifest = import_snapshot(cache, blob_store, snapshot_filename)
+        if manifest.get('trac_host') != trac_host:
+            log.warning(f'The snapshot was taken from {manifest.get("trac_host")}, not {trac_host}')
+        sys.exit()
+
+    source = make_source()
+
+    if command == 'prefetch':
+        prefetch(source)
+        output_cache_statistics(cache_stats.as_dict())
+        sys.exit()
 
     github = None
     dest = None
@@ -2917,3 +4074,4 @@ if __name__ == "__main__":
         output_unmapped_milestones(sorted(unmapped_milestones.items(), key=lambda x: -x[1]))
         output_keyword_frequency(sorted(keyword_frequency.items(), key=lambda x: -x[1]))
         output_component_frequency(sorted(component_frequency.items(), key=lambda x: -x[1]))
+        output_cache_statistics(cache_stats.as_dict())
@@ -0,0 +1,90 @@
+import os
+import sys
+
+import pytest
+
+from fake_trac import CHANGETIME, FakeTrac, changetime, missing_ticket
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CONFIG = '''
+[source]
+url: https://trac.example.org/xmlrpc
+cgit_url: https://git.example.org/project.git/
+keep_trac_ticket_references: no
+
+[issues]
+migrate: yes
+migrate_milestones: no
+
+[attachments]
+export: yes
+export_dir: archive/attachments
+
+[wiki]
+migrate: no
+url: https://github.com/example/project/wiki
+
+[target]
+issues_repo_url: https://github.com/example/project
+git_repo_url: https://github.com/example/project
+project_name: example/project
+usernames: {'alice': 'alice-gh'}
+'''
+
+@pytest.fixture(scope='session')
+def migrate(tmp_path_factory):
+    """
+    The module ``migrate`` configured by ``CONFIG``, with its caches in a
+    temporary directory.
+    """
+    directory = tmp_path_factory.mktemp('migration')
+    (directory / 'migrate.cfg').write_text(CONFIG)
+    cwd, argv = os.getcwd(), sys.argv
+    os.chdir(directory)
+    sys.argv = ['migrate.py', 'migrate.cfg']
+    try:
+        import migrate
+    finally:
+        sys.argv = argv
+    migrate.github = None
+    yield migrate
+    os.chdir(cwd)
+
+@pytest.fixture
+def trac(migrate, monkeypatch):
+    """
+    Trac with the tickets 1, 2, 4 and 5, but no ticket 3, and the wiki pages
+    WikiStart and Foo. The tickets are in ``tickets``, and the ticket with
+    id ``n`` was changed last on day ``10 + n``. Worker threads use it as
+    their source.
+    """
+    migrate.cache.clear()
+    tickets = {src_ticket_id: [src_ticket_id, CHANGETIME, changetime(10 + src_ticket_id),
+                               {'summary': f'Ticket {src_ticket_id}'}]
+               for src_ticket_id in (1, 2, 4, 5)}
+    changelogs = {src_ticket_id: [[CHANGETIME, 'alice', 'comment', '1', f'Comment on {src_ticket_id}', 1]]
+                  for src_ticket_id in tickets}
+
+    def getter(results):
+        def get(src_ticket_id):
+            if src_ticket_id not in results:
+                missing_ticket(src_ticket_id)
+            return results[src_ticket_id]
+        return get
+
+    def query(qstr):
+        if qstr == 'order=changetime&desc=1&max=1':
+            return [max(tickets, key=lambda src_ticket_id: tickets[src_ticket_id][2])]
+        return sorted(tickets)
+
+    source = FakeTrac({'ticket.query': query,
+                       'ticket.get': getter(tickets),
+                       'ticket.changeLog': getter(changelogs),
+                       'ticket.listAttachments': getter(dict.fromkeys(tickets, [])),
+                       'ticket.getRecentChanges': lambda since: sorted(
+                           src_ticket_id for src_ticket_id, ticket in tickets.items() if ticket[2] >= since),
+                       'wiki.getAllPages': lambda: ['WikiStart', 'Foo']})
+    source.tickets = tickets
+    monkeypatch.setattr(migrate, 'thread_source', lambda: source)
+    return source
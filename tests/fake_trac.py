@@ -0,0 +1,52 @@
+from xmlrpc import client
+
+# changetime of the tickets of the tests
+CHANGETIME = client.DateTime('20200913T12:30:00')
+
+def changetime(day):
+    "Time of a change on the given day of September 2020"
+    return client.DateTime(f'202009{day:02}T12:30:00')
+
+class FakeTrac:
+    """
+    Stand-in for the ``ServerProxy`` of Trac that answers calls and MultiCalls
+    with the results of the functions ``methods`` by method name. The calls
+    are recorded in ``calls``.
+    """
+    def __init__(self, methods):
+        self.methods = methods
+        self.calls = []
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return FakeMethod(self, name)
+
+    def call(self, method, params):
+        self.calls.append((method, params))
+        if method == 'system.multicall':
+            results = []
+            for call in params[0]:
+                try:
+                    results.append([self.call(call['methodName'], call['params'])])
+                except client.Fault as e:
+                    results.append({'faultCode': e.faultCode, 'faultString': e.faultString})
+            return results
+        return self.methods[method](*params)
+
+class FakeMethod:
+    def __init__(self, trac, name):
+        self._trac = trac
+        self._name = name
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return FakeMethod(self._trac, f'{self._name}.{name}')
+
+    def __call__(self, *params):
+        return self._trac.call(self._name, params)
+
+def missing_ticket(src_ticket_id):
+    "Raise the fault of Trac for a ticket that does not exist"
+    raise client.Fault(404, f'Ticket {src_ticket_id} does not exist.')
@@ -0,0 +1,56 @@
+import os
+from xmlrpc import client
+
+import pytest
+
+@pytest.fixture
+def downloads(migrate, monkeypatch):
+    "Downloads of ticket attachments, whose contents name them"
+    migrate.cache.clear()
+    downloads = []
+
+    def download_ticket_attachment(src_ticket_id, attachment_name, filename):
+        downloads.append((src_ticket_id, attachment_name))
+        if attachment_name == 'missing.txt':
+            raise client.Fault(404, f'Attachment ticket:{src_ticket_id}/{attachment_name} does not exist.')
+        with open(filename, 'wb') as f:
+            f.write(f'{attachment_name} of #{src_ticket_id}'.encode('utf-8'))
+
+    monkeypatch.setattr(migrate, 'download_ticket_attachment', download_ticket_attachment)
+    return downloads
+
+def test_download_again_if_dropped_from_blob_store(migrate, downloads):
+    downloader = migrate.AttachmentDownloader(max_workers=1)
+    try:
+        download = downloader.submit(7, 'a.txt')
+        open_attachment = download.result()
+        digest = migrate.cache.get(migrate.attachment_blob_key('ticket', 7, 'a.txt'))
+        path, _ = migrate.blob_store.find(digest)
+        os.remove(path)
+        with migrate.open_downloaded_attachment(download, 'a.txt') as f:
+            assert f.read() == b'a.txt of #7'
+        assert downloads == [(7, 'a.txt'), (7, 'a.txt')]
+        with open_attachment() as f:
+            assert f.read() == b'a.txt of #7'
+        assert len(downloads) == 2
+    finally:
+        downloader.close()
+
+def test_skip_missing_attachment(migrate, downloads):
+    downloader = migrate.AttachmentDownloader(max_workers=1)
+    try:
+        assert migrate.open_downloaded_attachment(downloader.submit(7, 'missing.txt'), 'missing.txt') is None
+    finally:
+        downloader.close()
+
+def test_programming_errors_propagate(migrate, downloads, monkeypatch):
+    def download_ticket_attachment(src_ticket_id, attachment_name, filename):
+        return {}['no such key']
+
+    monkeypatch.setattr(migrate, 'download_ticket_attachment', download_ticket_attachment)
+    downloader = migrate.AttachmentDownloader(max_workers=1)
+    try:
+        with pytest.raises(KeyError):
+            migrate.open_downloaded_attachment(downloader.submit(7, 'a.txt'), 'a.txt')
+    finally:
+        downloader.close()
@@ -0,0 +1,88 @@
+import gzip
+import hashlib
+import os
+
+import pytest
+
+from blob_store import BlobMissing, BlobStore, is_compressible
+
+def read(store, digest):
+    with store.open(digest) as f:
+        return f.read()
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_put_bytes(tmp_path, compress):
+    store = BlobStore(str(tmp_path))
+    data = b'diff --git a/src b/src\n' * 100
+    digest = store.put_bytes(data, compress=compress)
+    assert digest == hashlib.sha256(data).hexdigest()
+    assert digest in store
+    path, compressed = store.find(digest)
+    assert compressed == compress
+    assert path.endswith('.gz') == compress
+    assert read(store, digest) == data
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_put_file(tmp_path, compress):
+    store = BlobStore(str(tmp_path))
+    filename = store.temporary_filename()
+    with open(filename, 'wb') as f:
+        f.write(b'contents')
+    digest = store.put_file(filename, compress=compress)
+    assert not os.path.exists(filename)
+    assert read(store, digest) == b'contents'
+    assert [(d, c) for d, c, _ in store.blobs()] == [(digest, compress)]
+
+def test_equal_contents_are_stored_once(tmp_path):
+    store = BlobStore(str(tmp_path))
+    digest = store.put_bytes(b'contents')
+    assert store.put_bytes(b'contents', compress=False) == digest
+    assert len(list(store.blobs())) == 1
+    assert os.listdir(os.path.join(str(tmp_path), 'tmp')) == []
+
+def test_put_blob(tmp_path):
+    source = BlobStore(str(tmp_path / 'source'))
+    digest = source.put_bytes(b'contents')
+    path, compressed = source.find(digest)
+    store = BlobStore(str(tmp_path / 'store'))
+    with open(path, 'rb') as f:
+        assert store.put_blob(f, compressed) == digest
+    assert read(store, digest) == b'contents'
+    with open(store.find(digest)[0], 'rb') as f:
+        assert gzip.decompress(f.read()) == b'contents'
+
+def test_size_is_counted_on_reopening(tmp_path):
+    store = BlobStore(str(tmp_path))
+    store.put_bytes(b'x' * 1000, compress=False)
+    assert BlobStore(str(tmp_path))._size == 1000
+
+def test_cull_removes_least_recently_used(tmp_path):
+    store = BlobStore(str(tmp_path), size_limit=2500)
+    old, used = (store.put_bytes(bytes([i]) * 1000, compress=False) for i in range(2))
+    for digest in (old, used):
+        os.utime(store.find(digest)[0], (0, 0))
+    # reading marks the blob as recently used
+    read(store, used)
+    new = store.put_bytes(b'\x02' * 1000, compress=False)
+    assert old not in store
+    assert used in store and new in store
+    with pytest.raises(BlobMissing):
+        store.open(old)
+
+def test_missing_blob(tmp_path):
+    store = BlobStore(str(tmp_path))
+    with pytest.raises(BlobMissing):
+        store.open('0' * 64)
+    digest = store.put_bytes(b'contents')
+    os.remove(store.find(digest)[0])
+    with pytest.raises(BlobMissing):
+        store.open(digest)
+
+def test_is_compressible():
+    assert is_compressible('fix.patch')
+    assert is_compressible('notes')
+    assert is_compressible('plot.svg')
+    assert not is_compressible('plot.png')
+    assert not is_compressible('sage-9.1.tar.gz')
+    assert not is_compressible('sage-9.1.tgz')
+    assert not is_compressible('paper.pdf')
@@ -0,0 +1,57 @@
+import io
+import json
+import tarfile
+
+import pytest
+from diskcache import Cache
+
+from blob_store import BlobStore
+from cache_snapshot import SNAPSHOT_FORMAT, export_snapshot, import_snapshot
+from fake_trac import CHANGETIME
+
+def test_round_trip(tmp_path):
+    with Cache(str(tmp_path / 'cache')) as cache:
+        blob_store = BlobStore(str(tmp_path / 'blobs'))
+        cache['tickets_changed_since'] = CHANGETIME
+        cache[('migrate.get_ticket', 1)] = [1, CHANGETIME, CHANGETIME, {'summary': 'Ticket 1'}]
+        patch = blob_store.put_bytes(b'diff --git a/src b/src\n')
+        image = blob_store.put_bytes(b'\x89PNG', compress=False)
+        snapshot = str(tmp_path / 'snapshot.tar.gz')
+        manifest = export_snapshot(cache, blob_store, snapshot, trac_url='https://trac.example.org')
+        assert (manifest['entries'], manifest['blobs']) == (2, 2)
+
+    with Cache(str(tmp_path / 'imported')) as cache:
+        cache['tickets_changed_since'] = None
+        blob_store = BlobStore(str(tmp_path / 'imported-blobs'))
+        manifest = import_snapshot(cache, blob_store, snapshot)
+        assert manifest['trac_url'] == 'https://trac.example.org'
+        assert manifest['format'] == SNAPSHOT_FORMAT
+        assert cache['tickets_changed_since'] == CHANGETIME
+        assert cache[('migrate.get_ticket', 1)][3] == {'summary': 'Ticket 1'}
+        assert len(cache) == 2
+        with blob_store.open(patch) as f:
+            assert f.read() == b'diff --git a/src b/src\n'
+        assert blob_store.find(image)[1] is False
+        with blob_store.open(image) as f:
+            assert f.read() == b'\x89PNG'
+
+def write_tar(filename, members):
+    with tarfile.open(filename, 'w:gz') as tar:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+def test_unsupported_format(tmp_path):
+    snapshot = str(tmp_path / 'snapshot.tar.gz')
+    write_tar(snapshot, [('snapshot.json', json.dumps({'format': SNAPSHOT_FORMAT + 1}).encode())])
+    with Cache(str(tmp_path / 'cache')) as cache:
+        with pytest.raises(ValueError, match='not supported'):
+            import_snapshot(cache, BlobStore(str(tmp_path / 'blobs')), snapshot)
+
+def test_not_a_snapshot(tmp_path):
+    snapshot = str(tmp_path / 'snapshot.tar.gz')
+    write_tar(snapshot, [('entries.pickle', b'')])
+    with Cache(str(tmp_path / 'cache')) as cache:
+        with pytest.raises(ValueError, match='not a snapshot'):
+            import_snapshot(cache, BlobStore(str(tmp_path / 'blobs')), snapshot)
@@ -0,0 +1,27 @@
+from xmlrpc import client
+
+from cache_statistics import CacheStatistics, MeasuringDisk
+from fake_trac import FakeTrac
+
+def test_prefetched_bytes_of_stamped_getter(migrate, monkeypatch):
+    monkeypatch.setattr(migrate, 'cache_stats', CacheStatistics())
+    migrate.cache.clear()
+    changetime = client.DateTime('20200913T12:30:00')
+    for src_ticket_id in (1, 2):
+        # stamps are only written for tickets with a known changetime
+        migrate.cache.set(migrate.get_ticket.__cache_key__(None, src_ticket_id),
+                          [src_ticket_id, changetime, changetime, {}])
+    changelog = [[changetime, 'alice', 'comment', '1', 'x' * 1000 + str(i), 1] for i in range(20)]
+    source = FakeTrac({'ticket.changeLog': lambda src_ticket_id: changelog})
+
+    batcher = migrate.MultiCallBatcher(migrate.get_changeLog, 'ticket.changeLog', batch_size=2)
+    batcher.fetch(source, [(1,), (2,)])
+
+    payload = 0
+    for src_ticket_id in (1, 2):
+        assert migrate.cache.get(migrate.changetime_stamp_key(migrate.get_changeLog, src_ticket_id)) == changetime
+        assert migrate.cache.get(migrate.get_changeLog.__cache_key__(None, src_ticket_id)) == changelog
+        payload += MeasuringDisk.last_fetched()
+    counters = migrate.cache_stats.as_dict()['get_changeLog']
+    assert counters['prefetched'] == 2
+    assert counters['bytes_written'] == payload > 2 * 20000
@@ -0,0 +1,37 @@
+from fake_trac import changetime
+
+def fetch_all(migrate, source, ticket_ids, high_water_mark):
+    return [ticket[0] for ticket in migrate.get_all_tickets(source, ticket_ids, high_water_mark=high_water_mark)]
+
+def test_full_fetch_records_latest_change_before_it(migrate, trac):
+    ticket_ids = migrate.ticket_fetch_plan(trac)
+    high_water_mark = migrate.full_fetch_high_water_mark(trac, ticket_ids)
+    # changed while the tickets are fetched
+    trac.tickets[1][2] = changetime(20)
+    assert fetch_all(migrate, trac, ticket_ids, high_water_mark) == [1, 2, 4, 5]
+    assert migrate.cache.get(migrate.TICKETS_HIGH_WATER_MARK) == changetime(15)
+
+def test_no_mark_from_cached_tickets(migrate, trac):
+    ticket_ids = migrate.ticket_fetch_plan(trac)
+    migrate.get_ticket(trac, 1)
+    assert migrate.full_fetch_high_water_mark(trac, ticket_ids) is None
+
+def test_no_mark_if_a_ticket_fails(migrate, trac):
+    high_water_mark = migrate.full_fetch_high_water_mark(trac, [1, 2, 3])
+    assert fetch_all(migrate, trac, [1, 2, 3], high_water_mark) == [1, 2]
+    assert migrate.TICKETS_HIGH_WATER_MARK not in migrate.cache
+
+def test_mark_never_moves_back(migrate, trac):
+    migrate.set_tickets_high_water_mark(changetime(14))
+    migrate.set_tickets_high_water_mark(changetime(12))
+    migrate.set_tickets_high_water_mark(None)
+    assert migrate.cache.get(migrate.TICKETS_HIGH_WATER_MARK) == changetime(14)
+
+def test_incremental_refresh(migrate, trac):
+    ticket_ids = migrate.ticket_fetch_plan(trac)
+    fetch_all(migrate, trac, ticket_ids, migrate.full_fetch_high_water_mark(trac, ticket_ids))
+    trac.tickets[2][2] = changetime(21)
+    trac.tickets[2][3] = {'summary': 'Ticket 2, edited'}
+    migrate.refresh_changed_tickets(trac)
+    assert migrate.get_ticket(trac, 2)[3] == {'summary': 'Ticket 2, edited'}
+    assert migrate.cache.get(migrate.TICKETS_HIGH_WATER_MARK) == changetime(21)
@@ -0,0 +1,29 @@
+import pytest
+
+from fake_trac import CHANGETIME
+
+def test_offline_run_after_prefetch(migrate, trac, monkeypatch):
+    monkeypatch.setattr(migrate, 'only_issues', range(1, 6))
+    migrate.prefetch(trac)
+
+    monkeypatch.setattr(migrate, 'offline', True)
+    source = migrate.OfflineSource()
+    monkeypatch.setattr(migrate, 'thread_source', lambda: source)
+    migrate.IssuesConversionHelper(source)
+    ticket_ids = migrate.ticket_fetch_plan(source, migrate.only_issues)
+    prefetcher = migrate.TicketPrefetcher(ticket_ids)
+    try:
+        converted = {}
+        for src_ticket_id, _, _, _ in migrate.get_all_tickets(source, ticket_ids):
+            converted[src_ticket_id] = prefetcher.changeLog(source, src_ticket_id)
+    finally:
+        prefetcher.close()
+    assert list(converted) == [1, 2, 4, 5]
+    assert converted[5] == [[CHANGETIME, 'alice', 'comment', '1', 'Comment on 5', 1]]
+
+def test_offline_cache_miss(migrate, trac):
+    source = migrate.OfflineSource()
+    with pytest.raises(migrate.CacheMiss):
+        migrate.get_ticket(source, 1)
+    with pytest.raises(migrate.CacheMiss):
+        migrate.ticket_batcher.fetch(source, [(1,), (2,)])
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from xmlrpc import client
+
+import pytest
+
+from trac_xmlrpc import RpcScheduler
+
+class Server:
+    "Requests that record how many of them are in flight"
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def _enter(self):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def _leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def request(self, i):
+        self._enter()
+        time.sleep(0.01)
+        self._leave()
+        return i
+
+    async def arequest(self, i):
+        self._enter()
+        await asyncio.sleep(0.01)
+        self._leave()
+        return i
+
+def test_max_concurrent_requests():
+    scheduler = RpcScheduler(max_rate=None, max_concurrent=2)
+    server = Server()
+
+    async def fetch():
+        return await asyncio.gather(*(scheduler.acall(server.arequest, i) for i in range(8)))
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        futures = [executor.submit(scheduler.call, server.request, i) for i in range(20)]
+        assert asyncio.run(fetch()) == list(range(8))
+        assert [future.result() for future in futures] == list(range(20))
+    assert server.max_in_flight == 2
+
+def failing(*errors):
+    "Request that raises ``errors`` in turn, then returns the number of attempts"
+    attempts = []
+
+    def request():
+        attempts.append(None)
+        if len(attempts) <= len(errors):
+            raise errors[len(attempts) - 1]
+        return len(attempts)
+    return request
+
+@pytest.mark.parametrize('error', [client.Fault(404, 'Ticket 3 does not exist.'),
+                                   client.Fault(1, 'Internal error'),
+                                   client.ProtocolError('trac.example.org/xmlrpc', 404, 'Not Found', {})])
+def test_permanent_errors_pass_through(error):
+    scheduler = RpcScheduler(max_rate=None, backoff_base=0, breaker_threshold=1)
+    request = failing(error)
+    with pytest.raises(type(error)):
+        scheduler.call(request)
+    # no backoff, and the breaker stays closed
+    assert scheduler._failures == 0 and scheduler._open_until == 0
+    assert scheduler.call(request) == 2
+
+@pytest.mark.parametrize('error', [ConnectionResetError(),
+                                   client.ProtocolError('trac.example.org/xmlrpc', 500, 'Internal Server Error', {}),
+                                   client.ProtocolError('trac.example.org/xmlrpc', 503, 'Service Unavailable', {})])
+def test_transient_errors_are_retried(error):
+    scheduler = RpcScheduler(max_rate=None, backoff_base=0, breaker_threshold=10, breaker_cooldown=0)
+    assert scheduler.call(failing(error, error)) == 3
@@ -0,0 +1,17 @@
+import pytest
+
+from fake_trac import CHANGETIME
+
+@pytest.mark.parametrize('ahead', [0, 4])
+def test_missing_ticket_of_only_issues(migrate, trac, ahead):
+    ticket_ids = migrate.ticket_fetch_plan(trac, only_issues=range(1, 6))
+    assert ticket_ids == [1, 2, 3, 4, 5]
+    prefetcher = migrate.TicketPrefetcher(ticket_ids, ahead=ahead, max_workers=2)
+    try:
+        converted = {}
+        for src_ticket_id, _, _, _ in migrate.get_all_tickets(trac, ticket_ids):
+            converted[src_ticket_id] = prefetcher.changeLog(trac, src_ticket_id)
+    finally:
+        prefetcher.close()
+    assert list(converted) == [1, 2, 4, 5]
+    assert converted[4] == [[CHANGETIME, 'alice', 'comment', '1', 'Comment on 4', 1]]
@@ -0,0 +1,54 @@
+import pytest
+
+@pytest.fixture
+def issues(migrate, monkeypatch):
+    "Conversion helper for ticket #7, with the wiki pages WikiStart and Foo"
+    monkeypatch.setattr(migrate, 'conversion_cache', None)
+    monkeypatch.setattr(migrate, 'conversion_memo', migrate.OrderedDict())
+    migrate.cache.set(migrate.get_all_wiki_pages.__cache_key__(None), ['WikiStart', 'Foo'])
+    helper = migrate.IssuesConversionHelper(None)
+    helper.set_ticket_paths(7)
+    return helper
+
+# Lines on which rules of the same family overlap or convert what the
+# rules before them produced, as converted by the rules one by one
+@pytest.mark.parametrize('text, expected', [
+    ('[[Image(g, [[Image(g)]]',
+     '[[Image(g, ![](https://github.com/example/project/files/ticket7/g)'),
+    ('[[Image(g, 50%)]] [[Image(g)]]',
+     '<img src="g" width=50%> ![](https://github.com/example/project/files/ticket7/g)'),
+    ('[[|[[e|g]]',
+     '[[|[Trac macro e](https://trac.example.org/wiki/WikiMacros#e-macro)'),
+    ('[[["r"]]',
+     '[[Trac macro r](https://trac.example.org/wiki/WikiMacros#r-macro)'),
+    ('[http://[[http://c]]]',
+     '[http://[http://c](http://c)](http://[http://c](http://c))'),
+    ('[wiki:Foo bar] [[Foo|baz]]',
+     '[bar](../wiki/Foo) [baz](../wiki/Foo)'),
+])
+def test_overlapping_rules(migrate, issues, text, expected):
+    assert migrate.trac2markdown(text, '/issues/', issues, False) == expected
+
+@pytest.mark.parametrize('family', ['RE_HTTPS', 'RE_IMAGE', 'RE_TICKET_COMMENT', 'RE_COMMENT',
+                                    'RE_ATTACHMENT', 'RE_WIKI', 'RE_WIKI_BRACKETS'])
+def test_rule_family_applies_rules_in_turn(migrate, family):
+    def repl(match):
+        return '<%s>' % match.group(0)
+    family = getattr(migrate, family)
+    for text in ['[[Image(g, [[Image(g)]]', '[[|[[e|g]]', '[[["r"]]', '[http://[[http://c]]]',
+                 '[ticket:1#comment:2 x] [[comment:3|y]] comment:4', 'no link',
+                 '[attachment:a.png the image] [[attachment:b.txt]] attachment:c.py',
+                 '[wiki:Foo bar] [["Foo Bar" baz]] [Word text]']:
+        expected = text
+        for rule in family._rules:
+            expected = rule.sub(repl, expected)
+        assert family.sub(repl, text) == expected
+
+@pytest.mark.parametrize('setting, value', [('trac_path', '/trac/'),
+                                            ('target_url_wiki', 'https://example.org/wiki')])
+def test_conversion_key_depends_on_settings(migrate, issues, monkeypatch, setting, value):
+    monkeypatch.setattr(migrate, 'conversion_settings_digest', None)
+    key = migrate.conversion_key('text', '/issues/', issues, False)
+    monkeypatch.setattr(migrate, setting, value)
+    monkeypatch.setattr(migrate, 'conversion_settings_digest', None)
+    assert migrate.conversion_key('text', '/issues/', issues, False) != key
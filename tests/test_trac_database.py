@@ -0,0 +1,111 @@
+import os
+import sqlite3
+from xmlrpc import client
+
+import pytest
+
+from fake_trac import changetime
+from trac_database import TracDatabaseSource, to_timestamp
+
+SCHEMA = """
+CREATE TABLE ticket (id integer PRIMARY KEY, type text, time integer, changetime integer,
+                     component text, severity text, priority text, owner text, reporter text,
+                     cc text, version text, milestone text, status text, resolution text,
+                     summary text, description text, keywords text);
+CREATE TABLE ticket_custom (ticket integer, name text, value text);
+CREATE TABLE ticket_change (ticket integer, time integer, author text, field text,
+                            oldvalue text, newvalue text);
+CREATE TABLE attachment (type text, id text, filename text, size integer, time integer,
+                         description text, author text);
+CREATE TABLE wiki (name text, version integer, time integer, author text, text text,
+                   comment text, readonly integer);
+"""
+
+@pytest.fixture
+def source(tmp_path):
+    "A Trac environment with a SQLite database of two tickets and a wiki page"
+    os.makedirs(tmp_path / 'conf')
+    os.makedirs(tmp_path / 'db')
+    with open(tmp_path / 'conf' / 'trac.ini', 'w') as f:
+        f.write('[trac]\ndatabase = sqlite:db/trac.db\n')
+    conn = sqlite3.connect(tmp_path / 'db' / 'trac.db')
+    conn.executescript(SCHEMA)
+    for id, day in [(1, 11), (2, 12)]:
+        conn.execute('INSERT INTO ticket (id, type, time, changetime, status, summary, description, reporter)'
+                     ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                     (id, 'defect', to_timestamp(changetime(1)), to_timestamp(changetime(day)),
+                      'new', f'Ticket {id}', 'Something is broken', 'alice'))
+    conn.execute('INSERT INTO ticket_custom VALUES (1, ?, ?)', ('branch', 'u/alice/fix'))
+    conn.execute('INSERT INTO ticket_change VALUES (1, ?, ?, ?, ?, ?)',
+                 (to_timestamp(changetime(11)), 'bob', 'status', 'new', 'needs_review'))
+    conn.execute('INSERT INTO ticket_change VALUES (1, ?, ?, ?, ?, ?)',
+                 (to_timestamp(changetime(11)), 'bob', 'comment', '1', 'Please review'))
+    conn.execute('INSERT INTO attachment VALUES (?, ?, ?, ?, ?, ?, ?)',
+                 ('ticket', '1', 'fix.patch', 42, to_timestamp(changetime(10)), 'A fix', 'bob'))
+    for version, text in [(1, 'Welcome'), (2, 'Welcome to Trac')]:
+        conn.execute('INSERT INTO wiki VALUES (?, ?, ?, ?, ?, ?, ?)',
+                     ('WikiStart', version, to_timestamp(changetime(version)), 'alice', text, None, 0))
+    conn.commit()
+    conn.close()
+    return TracDatabaseSource(str(tmp_path))
+
+def test_ticket_get(source):
+    id, time, ticket_changetime, attributes = source.ticket.get(1)
+    assert id == 1
+    assert time == changetime(1)
+    assert ticket_changetime == changetime(11)
+    assert isinstance(ticket_changetime, client.DateTime)
+    assert attributes['summary'] == 'Ticket 1'
+    assert attributes['branch'] == 'u/alice/fix'
+    assert attributes['time'] == time and attributes['changetime'] == ticket_changetime
+    # NULL columns are marshalled as the empty string
+    assert attributes['milestone'] == ''
+    with pytest.raises(client.Fault) as e:
+        source.ticket.get(3)
+    assert e.value.faultCode == 404
+
+def test_ticket_changeLog(source):
+    assert source.ticket.changeLog(1) == [
+        [changetime(10), 'bob', 'attachment', '', 'fix.patch', 0],
+        [changetime(10), 'bob', 'comment', '', 'A fix', 0],
+        [changetime(11), 'bob', 'comment', '1', 'Please review', 1],
+        [changetime(11), 'bob', 'status', 'new', 'needs_review', 1],
+    ]
+    assert source.ticket.changeLog(2) == []
+    assert dict(source.changeLogs()) == {1: source.ticket.changeLog(1)}
+
+def test_wiki_getPage(source):
+    assert source.wiki.getPage('WikiStart') == 'Welcome to Trac'
+    assert source.wiki.getAllPages() == ['WikiStart']
+    info = source.wiki.getPageInfo('WikiStart')
+    assert info['version'] == 2 and info['lastModified'] == changetime(2)
+    assert info['comment'] == ''
+    with pytest.raises(client.Fault) as e:
+        source.wiki.getPage('Missing')
+    assert e.value.faultCode == 404
+
+def test_multicall(source):
+    multicall = client.MultiCall(source)
+    multicall.ticket.get(2)
+    multicall.ticket.get(3)
+    multicall.wiki.getPage('WikiStart')
+    results = source.system.multicall([
+        {'methodName': 'ticket.get', 'params': [2]},
+        {'methodName': 'ticket.get', 'params': [3]},
+        {'methodName': 'wiki.getPage', 'params': ['WikiStart']},
+    ])
+    assert results[0] == [source.ticket.get(2)]
+    assert results[1] == {'faultCode': 404, 'faultString': 'Ticket 3 does not exist.'}
+    assert results[2] == ['Welcome to Trac']
+    # client.MultiCall unpacks the results like those of the XML-RPC plugin
+    iterator = multicall()
+    assert iterator[0][0] == 2
+    with pytest.raises(client.Fault):
+        iterator[1]
+    assert iterator[2] == 'Welcome to Trac'
+
+def test_query(source):
+    assert source.ticket.query('status=new') == [1, 2]
+    assert source.ticket.query('order=changetime&desc=1&max=1') == [2]
+    assert source.ticket.query('branch~=alice') == [1]
+    assert source.ticket.getRecentChanges(changetime(12)) == [2]
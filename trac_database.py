@@ -0,0 +1,414 @@
+'''
+Read access to the database and attachment files of a Trac environment.
+
+This software is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This sotfware is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with this library. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import configparser
+import functools
+import hashlib
+import itertools
+import logging
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qsl, urlparse, unquote, quote
+from xmlrpc import client
+
+log = logging.getLogger("trac_to_gh")
+
+TICKET_COLUMNS = ['type', 'time', 'changetime', 'component', 'severity', 'priority', 'owner',
+                  'reporter', 'cc', 'version', 'milestone', 'status', 'resolution',
+                  'summary', 'description', 'keywords']
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def is_trac_environment(path):
+    return bool(path) and os.path.isfile(os.path.join(path, 'conf', 'trac.ini'))
+
+def from_timestamp(t):
+    """
+    Convert a timestamp of the Trac database to the ``client.DateTime`` that
+    the XML-RPC plugin would return.
+
+    Trac 0.12 and later store microseconds since the epoch, older versions seconds.
+    """
+    if not t:
+        return 0
+    if t < 1e11:
+        return client.DateTime(EPOCH + timedelta(seconds=t))
+    return client.DateTime(EPOCH + timedelta(microseconds=t))
+
+def to_timestamp(dt):
+    "Convert a ``client.DateTime`` to microseconds since the epoch"
+    dt = datetime.strptime(str(dt), "%Y%m%dT%H:%M:%S").replace(tzinfo=timezone.utc)
+    return (dt - EPOCH) // timedelta(microseconds=1)
+
+_extension_re = re.compile(r'\.[A-Za-z0-9]+\Z')
+
+def attachment_file(env_path, realm, parent_id, filename):
+    """
+    Return the path of the attachment ``filename`` of the ticket or wiki page
+    ``parent_id`` in the Trac environment, or ``None`` if there is no such file.
+
+    Trac 1.0 and later store attachments under hashed names, older versions
+    under the quoted names.
+    """
+    parent_id = str(parent_id)
+    parent_hash = hashlib.sha1(parent_id.encode('utf-8')).hexdigest()
+    filename_hash = hashlib.sha1(filename.encode('utf-8')).hexdigest()
+    if m := _extension_re.search(filename):
+        filename_hash += m.group(0)
+    for path in [os.path.join(env_path, 'files', 'attachments', realm,
+                              parent_hash[0:3], parent_hash, filename_hash),
+                 os.path.join(env_path, 'attachments', realm,
+                              quote(parent_id.encode('utf-8')), quote(filename.encode('utf-8')))]:
+        if os.path.isfile(path):
+            return path
+    return None
+
+def xmlrpc_value(value):
+    "The XML-RPC plugin marshals NULL as the empty string"
+    if value is None:
+        return ''
+    return value
+
+def connect(env_path):
+    """
+    Return a DB-API connection and its parameter placeholder for the
+    database configured in ``conf/trac.ini`` of the Trac environment.
+    """
+    trac_ini = configparser.RawConfigParser()
+    trac_ini.read(os.path.join(env_path, 'conf', 'trac.ini'))
+    uri = trac_ini.get('trac', 'database', fallback='sqlite:db/trac.db')
+    scheme, _, rest = uri.partition(':')
+    if scheme == 'sqlite':
+        import sqlite3
+        path = rest if os.path.isabs(rest) else os.path.join(env_path, rest)
+        # read only; the connection is used by a single thread
+        return sqlite3.connect(f'file:{path}?mode=ro', uri=True), '?'
+    if scheme in ('postgres', 'postgresql'):
+        try:
+            import psycopg2
+        except ImportError:
+            raise RuntimeError(f'psycopg2 is needed to read the Trac database {uri}')
+        url = urlparse(uri)
+        params = dict(parse_qsl(url.query))
+        kwds = dict(host=url.hostname or params.get('host'), port=url.port,
+                    user=unquote(url.username or ''), password=unquote(url.password or ''),
+                    dbname=url.path.lstrip('/'))
+        conn = psycopg2.connect(**{k: v for k, v in kwds.items() if v})
+        conn.set_session(readonly=True, autocommit=True)
+        if 'schema' in params:
+            with conn.cursor() as cursor:
+                cursor.execute('SET search_path TO %s', (params['schema'],))
+        return conn, '%s'
+    raise RuntimeError(f'Unsupported Trac database {uri}')
+
+class Namespace:
+    """
+    A group of methods like ``ticket`` or ``wiki``.
+
+    Methods that are not implemented are looked up in the same namespace of the fallback.
+    """
+    def __init__(self, source, name):
+        self._source = source
+        self._name = name
+
+    def __getattr__(self, name):
+        if self._source.fallback is None:
+            raise AttributeError(f'{self._name}.{name} is not available from the Trac database')
+        return getattr(functools.reduce(getattr, self._name.split('.'), self._source.fallback), name)
+
+class TicketNamespace(Namespace):
+
+    def query(self, qstr='status!=closed'):
+        return self._source.query_tickets(qstr)
+
+    def get(self, id):
+        return self._source.get_ticket(id)
+
+    def changeLog(self, id, when=0):
+        for _, changelog in self._source.changeLogs([id]):
+            return changelog
+        return []
+
+    def getRecentChanges(self, since):
+        return [id for id, in self._source.execute(
+            'SELECT id FROM ticket WHERE ' + self._source.since_clause('changetime') + ' ORDER BY id',
+            self._source.since_params(since))]
+
+    def listAttachments(self, id):
+        return self._source.list_attachments('ticket', id)
+
+    def getAttachment(self, id, filename):
+        return self._source.get_attachment('ticket', id, filename)
+
+class MilestoneNamespace(Namespace):
+
+    def getAll(self):
+        return [name for name, in self._source.execute('SELECT name FROM milestone ORDER BY name')]
+
+    def get(self, name):
+        for name, due, completed, description in self._source.execute(
+                'SELECT name, due, completed, description FROM milestone WHERE name=%s', (name,)):
+            return {'name': name, 'due': from_timestamp(due), 'completed': from_timestamp(completed),
+                    'description': xmlrpc_value(description)}
+        raise client.Fault(404, f'Milestone "{name}" does not exist.')
+
+class WikiNamespace(Namespace):
+
+    def getAllPages(self):
+        return [name for name, in self._source.execute('SELECT DISTINCT name FROM wiki ORDER BY name')]
+
+    def _latest(self, pagename):
+        for row in self._source.execute(
+                'SELECT name, version, time, author, text, comment FROM wiki'
+                ' WHERE name=%s ORDER BY version DESC LIMIT 1', (pagename,)):
+            return row
+        raise client.Fault(404, f'Wiki page "{pagename}" does not exist')
+
+    def getPage(self, pagename, version=None):
+        return xmlrpc_value(self._latest(pagename)[4])
+
+    def getPageInfo(self, pagename, version=None):
+        name, version, time, author, text, comment = self._latest(pagename)
+        return {'name': name, 'version': version, 'lastModified': from_timestamp(time),
+                'author': xmlrpc_value(author), 'comment': xmlrpc_value(comment)}
+
+    def getRecentChanges(self, since):
+        return [self.getPageInfo(name) for name, in self._source.execute(
+            'SELECT DISTINCT name FROM wiki WHERE ' + self._source.since_clause('time') + ' ORDER BY name',
+            self._source.since_params(since))]
+
+    def listAttachments(self, pagename):
+        return [pagename + '/' + filename
+                for filename, *_ in self._source.list_attachments('wiki', pagename)]
+
+    def getAttachment(self, path):
+        pagename, filename = path.rsplit('/', 1)
+        return self._source.get_attachment('wiki', pagename, filename)
+
+class SystemNamespace(Namespace):
+
+    def multicall(self, calls):
+        "Emulate ``system.multicall`` so that ``client.MultiCall`` can be used"
+        results = []
+        for call in calls:
+            try:
+                method = functools.reduce(getattr, call['methodName'].split('.'), self._source)
+                results.append([method(*call['params'])])
+            except client.Fault as e:
+                results.append({'faultCode': e.faultCode, 'faultString': e.faultString})
+            except Exception as e:
+                results.append({'faultCode': 1, 'faultString': f'{type(e).__name__}: {e}'})
+        return results
+
+class TracDatabaseSource:
+    """
+    Drop-in replacement for the ``client.ServerProxy`` of the Trac XML-RPC
+    plugin that reads tickets, changelogs, milestones, wiki pages and
+    attachment metadata directly from the database of the Trac environment.
+
+    Results have the same shape as those of the XML-RPC calls. Calls that
+    need more than the database (such as the contents of attachments) are
+    passed to ``fallback``, if given.
+
+    Instances must not be shared between threads.
+    """
+    def __init__(self, env_path, fallback=None):
+        self.env_path = env_path
+        self.fallback = fallback
+        self._conn, self._placeholder = connect(env_path)
+        self.ticket = TicketNamespace(self, 'ticket')
+        self.ticket.milestone = MilestoneNamespace(self, 'ticket.milestone')
+        self.wiki = WikiNamespace(self, 'wiki')
+        self.system = SystemNamespace(self, 'system')
+
+    def execute(self, sql, params=()):
+        cursor = self._conn.cursor()
+        cursor.execute(sql.replace('%s', self._placeholder), params)
+        return cursor
+
+    @staticmethod
+    def since_clause(column):
+        "SQL condition for the timestamps in ``column`` that are not older than a given time"
+        return f'({column} >= %s OR ({column} < 100000000000 AND {column} >= %s))'
+
+    @staticmethod
+    def since_params(since):
+        "The parameters for :meth:`since_clause` in microseconds and in seconds"
+        t = to_timestamp(since)
+        return t, t // 1000000
+
+    def _custom_fields(self, ticket_ids=None):
+        "Return a dictionary: ticket id -> dictionary of custom fields"
+        custom = {}
+        sql = 'SELECT ticket, name, value FROM ticket_custom'
+        params = ()
+        if ticket_ids is not None:
+            sql += ' WHERE ticket IN (%s)' % ','.join(['%s'] * len(ticket_ids))
+            params = tuple(ticket_ids)
+        for ticket, name, value in self.execute(sql, params):
+            custom.setdefault(ticket, {})[name] = xmlrpc_value(value)
+        return custom
+
+    def get_ticket(self, id):
+        for row in self.execute('SELECT id, %s FROM ticket WHERE id=%%s' % ', '.join(TICKET_COLUMNS), (id,)):
+            values = {column: xmlrpc_value(value) for column, value in zip(TICKET_COLUMNS, row[1:])}
+            values.update(self._custom_fields([id]).get(id, {}))
+            values['_ts'] = str(values['changetime'])
+            values['time'] = from_timestamp(values['time'])
+            values['changetime'] = from_timestamp(values['changetime'])
+            return [row[0], values['time'], values['changetime'], values]
+        raise client.Fault(404, f'Ticket {id} does not exist.')
+
+    def changetimes(self):
+        "Return a dictionary: ticket id -> ``changetime`` as returned by ``ticket.get``"
+        return {id: from_timestamp(changetime)
+                for id, changetime in self.execute('SELECT id, changetime FROM ticket')}
+
+    def _field_expression(self, field, params):
+        if field == 'id' or field in TICKET_COLUMNS:
+            return 't.' + field
+        params.append(field)
+        return '(SELECT c.value FROM ticket_custom c WHERE c.ticket=t.id AND c.name=%s)'
+
+    def query_tickets(self, qstr):
+        """
+        Return the ids of the tickets matching the Trac query string ``qstr``.
+
+        Supported are ``max``, ``page``, ``order``, ``desc`` and constraints with
+        the operators ``=``, ``~=``, ``^=``, ``$=`` and their negations; values
+        may be separated by ``|``, and ``id`` also accepts ranges like ``1-10,15``.
+        """
+        conditions = []
+        params = []
+        order = 'id'
+        desc = False
+        limit = 0
+        page = 1
+        for key, value in parse_qsl(qstr, keep_blank_values=True):
+            if key == 'max':
+                limit = int(value)
+            elif key == 'page':
+                page = int(value)
+            elif key == 'order':
+                order = value
+            elif key == 'desc':
+                desc = value not in ('0', 'False', 'false', '')
+            elif key in ('col', 'report', 'format', 'row', 'group', 'groupdesc', 'verbose'):
+                pass
+            else:
+                negate = False
+                mode = ''
+                if key and key[-1] in '~^$':
+                    key, mode = key[:-1], key[-1]
+                if key.endswith('!'):
+                    key, negate = key[:-1], True
+                if key == 'id':
+                    alternatives = []
+                    for part in value.split(','):
+                        first, _, last = part.partition('-')
+                        alternatives.append('t.id BETWEEN %s AND %s')
+                        params.extend([int(first), int(last or first)])
+                    condition = ' OR '.join(alternatives)
+                else:
+                    alternatives = []
+                    for alternative in value.split('|'):
+                        expression = self._field_expression(key, params)
+                        if mode == '~':
+                            params.append(f'%{alternative}%')
+                            alternatives.append(f'COALESCE({expression}, \'\') LIKE %s')
+                        elif mode == '^':
+                            params.append(f'{alternative}%')
+                            alternatives.append(f'COALESCE({expression}, \'\') LIKE %s')
+                        elif mode == '$':
+                            params.append(f'%{alternative}')
+                            alternatives.append(f'COALESCE({expression}, \'\') LIKE %s')
+                        else:
+                            params.append(alternative)
+                            alternatives.append(f'COALESCE({expression}, \'\')=%s')
+                    condition = ' OR '.join(alternatives)
+                if negate:
+                    condition = f'NOT ({condition})'
+                conditions.append(f'({condition})')
+        sql = 'SELECT t.id FROM ticket t'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        order_params = []
+        sql += ' ORDER BY ' + self._field_expression(order, order_params)
+        if desc:
+            sql += ' DESC'
+        if order != 'id':
+            sql += ', t.id'
+        if limit > 0:
+            sql += f' LIMIT {limit} OFFSET {(page - 1) * limit}'
+        return [id for id, in self.execute(sql, tuple(params + order_params))]
+
+    def changeLogs(self, ticket_ids=None):
+        """
+        Yield pairs ``(ticket id, changelog)`` for the tickets in ``ticket_ids``,
+        or for all tickets, in the format of ``ticket.changeLog``.
+
+        For many tickets, this is a single pass over the ``ticket_change``
+        and ``attachment`` tables.
+        """
+        params = []
+        ticket_condition = attachment_condition = ''
+        if ticket_ids is not None:
+            ticket_ids = sorted(set(int(id) for id in ticket_ids))
+            if not ticket_ids:
+                return
+            if len(ticket_ids) <= 500:
+                placeholders = ','.join(['%s'] * len(ticket_ids))
+                ticket_condition = f' AND ticket IN ({placeholders})'
+                attachment_condition = f' AND id IN ({placeholders})'
+                params = [ticket_ids, [str(id) for id in ticket_ids], [str(id) for id in ticket_ids]]
+            wanted = set(ticket_ids)
+        sql = ('SELECT ticket, time, author, field, oldvalue, newvalue, 1 AS permanent'
+               ' FROM ticket_change WHERE 1=1' + ticket_condition +
+               ' UNION SELECT CAST(id AS integer), time, author, \'attachment\', NULL, filename, 0 AS permanent'
+               ' FROM attachment WHERE type=\'ticket\'' + attachment_condition +
+               ' UNION SELECT CAST(id AS integer), time, author, \'comment\', NULL, description, 0 AS permanent'
+               ' FROM attachment WHERE type=\'ticket\'' + attachment_condition +
+               ' ORDER BY 1, 2, 7, 3, 4')
+        rows = self.execute(sql, tuple(itertools.chain.from_iterable(params)))
+        for ticket, changes in itertools.groupby(rows, key=lambda row: row[0]):
+            if ticket_ids is not None and ticket not in wanted:
+                continue
+            yield ticket, [[from_timestamp(time), xmlrpc_value(author), field,
+                            xmlrpc_value(oldvalue), xmlrpc_value(newvalue), permanent]
+                           for _, time, author, field, oldvalue, newvalue, permanent in changes]
+
+    def get_attachment(self, realm, id, filename):
+        """
+        Return the contents of the attachment as ``client.Binary``, reading the
+        file in the Trac environment or, if it is missing, asking the fallback.
+        """
+        path = attachment_file(self.env_path, realm, id, filename)
+        if path is not None:
+            with open(path, 'rb') as f:
+                return client.Binary(f.read())
+        if self.fallback is None:
+            raise client.Fault(404, f'Attachment {realm}:{id}:{filename} does not exist.')
+        if realm == 'wiki':
+            return self.fallback.wiki.getAttachment(f'{id}/{filename}')
+        return self.fallback.ticket.getAttachment(id, filename)
+
+    def list_attachments(self, realm, id):
+        return [[filename, xmlrpc_value(description), size, from_timestamp(time), xmlrpc_value(author)]
+                for filename, description, size, time, author in self.execute(
+                        'SELECT filename, description, size, time, author FROM attachment'
+                        ' WHERE type=%s AND id=%s ORDER BY time, filename', (realm, str(id)))]
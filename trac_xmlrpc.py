@@ -0,0 +1,431 @@
+'''
+XML-RPC transports and request scheduling for talking to the Trac server.
+
+This software is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This sotfware is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with this library. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import asyncio
+import binascii
+import contextlib
+import http.client
+import itertools
+import logging
+import os
+import random
+import threading
+import zlib
+from collections import defaultdict
+from time import sleep, monotonic
+from urllib.parse import urlparse
+from xml.parsers.expat import ExpatError
+from xmlrpc import client
+
+log = logging.getLogger("trac_to_gh")
+
+# HTTP status codes of an overloaded server
+OVERLOAD_STATUS_CODES = {429, 502, 503, 504}
+
+def is_transient_error(e):
+    """
+    Return whether the request that raised ``e`` may succeed when it is repeated:
+    a transport error, or an HTTP response with a 5xx status or saying that
+    the server is overloaded. Faults are answers of Trac, such as a missing
+    ticket, and are not transient.
+    """
+    if isinstance(e, client.Fault):
+        return False
+    if isinstance(e, client.ProtocolError):
+        return e.errcode >= 500 or e.errcode in OVERLOAD_STATUS_CODES
+    return isinstance(e, (OSError, http.client.HTTPException, ExpatError, client.ResponseError))
+
+def is_overload_error(e):
+    "Return whether ``e`` says that the server cannot keep up"
+    if isinstance(e, client.ProtocolError):
+        return e.errcode in OVERLOAD_STATUS_CODES
+    return isinstance(e, TimeoutError)
+
+class RpcScheduler:
+    """
+    Pacing and retrying of the requests that all threads send to the Trac server.
+
+    Requests start at ``rate`` per second on average, with bursts of up to
+    ``burst`` requests after idle periods (token bucket). The rate is halved on
+    each transient error, down to ``min_rate``, and grows again by ``rate_step``
+    with each successful request, up to ``max_rate`` (``None`` for no limit).
+
+    At most ``max_concurrent`` requests (``None`` for no limit) are in flight
+    at the same time, whichever thread or event loop sends them.
+
+    A request failing with a transient error (see :func:`is_transient_error`)
+    is repeated up to ``max_retries`` times (``None`` for no limit) after a
+    random delay below ``backoff_base * 2**attempt`` seconds, but at most
+    ``backoff_max`` seconds. Other errors, including all faults returned by
+    Trac, are raised at once and do not count as failures.
+
+    After ``breaker_threshold`` consecutive failures, or when the server reports
+    that it is overloaded, the circuit breaker opens: no thread starts a request
+    for ``breaker_cooldown`` seconds. The pause doubles each time the breaker
+    opens again before a request succeeded.
+    """
+    def __init__(self, max_rate=3.0, burst=5, min_rate=0.1, rate_step=0.1,
+                 max_retries=10, backoff_base=1.0, backoff_max=300.0,
+                 breaker_threshold=5, breaker_cooldown=60.0, max_concurrent=None):
+        self.max_rate = max_rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.rate_step = rate_step
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+
+        self.rate = max_rate
+        self._tokens = burst
+        self._refilled = monotonic()
+        self._failures = 0
+        self._cooldown = breaker_cooldown
+        self._open_until = 0
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+
+    def call(self, function, *args):
+        """
+        Return ``function(*args)`` once a request may be sent, retrying on transient errors.
+        """
+        for attempt in itertools.count():
+            while (wait := self._reserve()) > 0:
+                sleep(wait)
+            try:
+                with self._slot():
+                    result = function(*args)
+            except Exception as e:
+                sleep(self._retry_delay(e, attempt))
+            else:
+                self._succeeded()
+                return result
+
+    async def acall(self, function, *args):
+        """
+        Asynchronous :meth:`call` of the coroutine function ``function``.
+        """
+        for attempt in itertools.count():
+            while (wait := self._reserve()) > 0:
+                await asyncio.sleep(wait)
+            try:
+                async with self._async_slot():
+                    result = await function(*args)
+            except Exception as e:
+                await asyncio.sleep(self._retry_delay(e, attempt))
+            else:
+                self._succeeded()
+                return result
+
+    @contextlib.contextmanager
+    def _slot(self):
+        "Hold one of the ``max_concurrent`` slots for a request"
+        if self._slots is None:
+            yield
+            return
+        with self._slots:
+            yield
+
+    @contextlib.asynccontextmanager
+    async def _async_slot(self):
+        """
+        Hold one of the ``max_concurrent`` slots for a request without blocking
+        the event loop, whose other requests may hold the slots.
+        """
+        if self._slots is None:
+            yield
+            return
+        while not self._slots.acquire(blocking=False):
+            await asyncio.sleep(0.01)
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def _reserve(self):
+        """
+        Take a token if the circuit breaker is closed and one is available,
+        and return 0. Otherwise return the time to wait before trying again.
+        """
+        with self._lock:
+            now = monotonic()
+            wait = self._open_until - now
+            if wait > 0:
+                return wait
+            if self.rate is None:
+                return 0
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def _retry_delay(self, e, attempt):
+        """
+        Return the delay before the next attempt after the exception ``e``
+        in the attempt ``attempt``, or reraise ``e`` if it is not retried.
+        """
+        if not is_transient_error(e):
+            raise e
+        self._failed(e)
+        if self.max_retries is not None and attempt >= self.max_retries:
+            raise e
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        log.warning(f'Trac request failed ({e}), retrying in {delay:.1f}s')
+        return delay
+
+    def _succeeded(self):
+        with self._lock:
+            self._failures = 0
+            self._cooldown = self.breaker_cooldown
+            if self.rate is not None:
+                self.rate = min(self.max_rate, self.rate + self.rate_step)
+
+    def _failed(self, e):
+        with self._lock:
+            self._failures += 1
+            if self.rate is not None:
+                self.rate = max(self.min_rate, self.rate / 2)
+            now = monotonic()
+            if now >= self._open_until and (self._failures >= self.breaker_threshold
+                                            or is_overload_error(e)):
+                log.warning(f'The Trac server seems overloaded, pausing all requests for {self._cooldown:.1f}s')
+                self._open_until = now + self._cooldown
+                self._cooldown = min(self.backoff_max, 2 * self._cooldown)
+                self._failures = 0
+
+class ScheduledServerProxy(client.ServerProxy):
+    """
+    ``client.ServerProxy`` whose requests (including those of a
+    ``client.MultiCall``) go through the :class:`RpcScheduler` ``scheduler``.
+    """
+    def __init__(self, uri, scheduler, **kwds):
+        super().__init__(uri, **kwds)
+        self._scheduler = scheduler
+
+    def _ServerProxy__request(self, methodname, params):
+        return self._scheduler.call(super()._ServerProxy__request, methodname, params)
+
+class PooledTransport(client.Transport):
+    """
+    Thread-safe transport that keeps up to ``max_connections`` idle HTTP/1.1
+    connections per host open for reuse by the following requests.
+
+    Responses are requested gzip-compressed and decompressed chunk by chunk
+    while they are parsed, so that neither the compressed nor the decompressed
+    response is ever held in memory as a whole.
+    """
+    def __init__(self, max_connections=4, **kwds):
+        super().__init__(**kwds)
+        self.max_connections = max_connections
+        self._idle = defaultdict(list)  # host -> idle connections
+        self._pool_lock = threading.Lock()
+
+    def new_connection(self, host):
+        chost, _, _ = self.get_host_info(host)
+        return http.client.HTTPConnection(chost)
+
+    def _get_connection(self, host):
+        "Return an idle or a new connection and whether it has been used before"
+        with self._pool_lock:
+            if self._idle[host]:
+                return self._idle[host].pop(), True
+        return self.new_connection(host), False
+
+    def _put_connection(self, host, connection):
+        with self._pool_lock:
+            if len(self._idle[host]) < self.max_connections:
+                self._idle[host].append(connection)
+                return
+        connection.close()
+
+    def request(self, host, handler, request_body, verbose=False):
+        while True:
+            connection, reused = self._get_connection(host)
+            try:
+                response = self._send_request(connection, host, handler, request_body, verbose)
+            except (http.client.RemoteDisconnected, ConnectionResetError,
+                    ConnectionAbortedError, BrokenPipeError):
+                connection.close()
+                if reused:
+                    # the server has closed the idle connection
+                    continue
+                raise
+            except BaseException:
+                connection.close()
+                raise
+            break
+
+        try:
+            if response.status != 200:
+                response.read()
+                raise client.ProtocolError(host + handler, response.status, response.reason,
+                                           dict(response.getheaders()))
+            result = self.parse_response(response)
+        except (client.Fault, client.ProtocolError):
+            # the response has been read completely
+            self._put_connection(host, connection)
+            raise
+        except BaseException:
+            connection.close()
+            raise
+        self._put_connection(host, connection)
+        return result
+
+    def _send_request(self, connection, host, handler, request_body, verbose):
+        _, extra_headers, _ = self.get_host_info(host)
+        if verbose:
+            connection.set_debuglevel(1)
+        headers = self._headers + extra_headers
+        if self.accept_gzip_encoding:
+            connection.putrequest('POST', handler, skip_accept_encoding=True)
+            headers.append(('Accept-Encoding', 'gzip'))
+        else:
+            connection.putrequest('POST', handler)
+        headers.append(('Content-Type', 'text/xml'))
+        headers.append(('User-Agent', self.user_agent))
+        self.send_headers(connection, headers)
+        self.send_content(connection, request_body)
+        return connection.getresponse()
+
+    def parse_response(self, response):
+        decompressor = None
+        if response.getheader('Content-Encoding', '') == 'gzip':
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        parser, unmarshaller = self.getparser()
+        while True:
+            data = response.read(65536)
+            if not data:
+                break
+            if decompressor:
+                data = decompressor.decompress(data)
+            parser.feed(data)
+        if decompressor:
+            parser.feed(decompressor.flush())
+        parser.close()
+        return unmarshaller.close()
+
+    def close(self):
+        with self._pool_lock:
+            idle, self._idle = self._idle, defaultdict(list)
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+class PooledSafeTransport(PooledTransport):
+    """
+    :class:`PooledTransport` for HTTPS.
+    """
+    def __init__(self, max_connections=4, context=None, **kwds):
+        super().__init__(max_connections, **kwds)
+        self.context = context
+
+    def new_connection(self, host):
+        chost, _, x509 = self.get_host_info(host)
+        return http.client.HTTPSConnection(chost, None, context=self.context, **(x509 or {}))
+
+def pooled_transport(url, max_connections=4):
+    """
+    Return a pooled transport suitable for the scheme of ``url``.
+    """
+    if urlparse(url).scheme == 'https':
+        return PooledSafeTransport(max_connections)
+    return PooledTransport(max_connections)
+
+class StreamingBase64Unmarshaller(client.Unmarshaller):
+    """
+    Unmarshaller that decodes ``<base64>`` values chunk by chunk into the file
+    ``filename`` instead of building a ``bytes`` object in memory.
+
+    In the unmarshalled result, the value is replaced by ``filename``.
+    """
+    def __init__(self, filename):
+        super().__init__()
+        self._filename = filename
+        self._file = None
+        self._pending = ''
+
+    def start(self, tag, attrs):
+        super().start(tag, attrs)
+        if tag.split(':')[-1] == 'base64':
+            self._file = open(self._filename + '.part', 'wb')
+            self._pending = ''
+
+    def data(self, text):
+        if self._file is None:
+            return super().data(text)
+        text = self._pending + ''.join(text.split())
+        # decode only complete groups of 4 characters
+        complete = len(text) - len(text) % 4
+        self._file.write(binascii.a2b_base64(text[:complete]))
+        self._pending = text[complete:]
+
+    def end_base64(self, data):
+        with self._file:
+            if self._pending:
+                self._file.write(binascii.a2b_base64(self._pending))
+        self._file = None
+        os.replace(self._filename + '.part', self._filename)
+        self.append(self._filename)
+        self._value = 0
+
+    dispatch = dict(client.Unmarshaller.dispatch)
+    dispatch['base64'] = end_base64
+
+    def discard(self):
+        "Remove a partially written file"
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._filename + '.part')
+
+class StreamingBase64TransportMixin:
+    """
+    Transport mixin that writes the ``<base64>`` value of the next response
+    to the file ``self.filename`` while it is received.
+    """
+    filename = None
+
+    def getparser(self):
+        self._unmarshaller = StreamingBase64Unmarshaller(self.filename)
+        return client.ExpatParser(self._unmarshaller), self._unmarshaller
+
+    def parse_response(self, response):
+        self._unmarshaller = None
+        try:
+            return super().parse_response(response)
+        except BaseException:
+            if self._unmarshaller is not None:
+                self._unmarshaller.discard()
+            raise
+
+class StreamingBase64Transport(StreamingBase64TransportMixin, PooledTransport):
+    pass
+
+class StreamingBase64SafeTransport(StreamingBase64TransportMixin, PooledSafeTransport):
+    pass
+
+def streaming_base64_transport(url):
+    """
+    Return a streaming transport suitable for the scheme of ``url``.
+    """
+    if urlparse(url).scheme == 'https':
+        return StreamingBase64SafeTransport()
+    return StreamingBase64Transport()
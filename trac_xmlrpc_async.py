@@ -0,0 +1,268 @@
+'''
+Asynchronous XML-RPC client for the Trac server, based on asyncio streams.
+
+This software is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This sotfware is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with this library. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import asyncio
+import base64
+import contextlib
+import functools
+import http.client
+import ssl
+import zlib
+from urllib.parse import urlparse, unquote
+from xmlrpc import client
+
+class AsyncTransport:
+    """
+    HTTP/1.1 transport for the XML-RPC endpoint ``url`` on asyncio streams.
+
+    At most ``max_connections`` requests are sent at the same time, and the
+    connections are kept open for the following requests. Responses are
+    requested gzip-compressed and decompressed chunk by chunk while parsed.
+    """
+    user_agent = client.Transport.user_agent
+
+    def __init__(self, url, max_connections=4, ssl_context=None):
+        url = urlparse(url)
+        self.host = url.hostname
+        if url.scheme == 'https':
+            self.port = url.port or 443
+            self.ssl = ssl_context or ssl.create_default_context()
+        else:
+            self.port = url.port or 80
+            self.ssl = None
+        self.handler = url.path or '/RPC2'
+        if url.query:
+            self.handler += '?' + url.query
+        self.headers = [('Host', url.netloc.rpartition('@')[2]),
+                        ('User-Agent', self.user_agent),
+                        ('Content-Type', 'text/xml'),
+                        ('Accept-Encoding', 'gzip')]
+        if url.username is not None:
+            auth = unquote(url.username) + ':' + unquote(url.password or '')
+            self.headers.append(('Authorization', 'Basic ' + base64.b64encode(auth.encode()).decode('ascii')))
+        self._idle = []  # (reader, writer) of idle connections
+        self._slots = asyncio.Semaphore(max_connections)
+
+    async def request(self, request_body):
+        """
+        Send the XML-RPC request ``request_body`` and return the unmarshalled response.
+        """
+        async with self._slots:
+            while True:
+                if self._idle:
+                    reader, writer = self._idle.pop()
+                    reused = True
+                else:
+                    reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+                    reused = False
+                try:
+                    self._send_request(writer, request_body)
+                    await writer.drain()
+                    status, reason, headers = await self._read_head(reader)
+                except (http.client.RemoteDisconnected, ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if reused:
+                        # the server has closed the idle connection
+                        continue
+                    raise
+                except BaseException:
+                    writer.close()
+                    raise
+                break
+
+            try:
+                keep_alive = self._keep_alive(headers)
+                if status != 200:
+                    async for _ in self._read_body(reader, headers):
+                        pass
+                    raise client.ProtocolError(self.host + self.handler, status, reason, headers)
+                result = await self._parse_response(reader, headers)
+            except (client.Fault, client.ProtocolError):
+                # the response has been read completely
+                self._release(reader, writer, keep_alive)
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            self._release(reader, writer, keep_alive)
+            return result
+
+    def _send_request(self, writer, request_body):
+        head = [f'POST {self.handler} HTTP/1.1']
+        head += [f'{name}: {value}' for name, value in self.headers]
+        head.append(f'Content-Length: {len(request_body)}')
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + request_body)
+
+    async def _read_head(self, reader):
+        line = await reader.readline()
+        if not line:
+            raise http.client.RemoteDisconnected('Remote end closed connection without response')
+        version, status, reason = (line.decode('latin-1').rstrip('\r\n').split(' ', 2) + [''])[:3]
+        headers = {'_version': version}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return int(status), reason, headers
+
+    @staticmethod
+    def _keep_alive(headers):
+        connection = headers.get('connection', '').lower()
+        if connection == 'close':
+            return False
+        if headers['_version'] == 'HTTP/1.0' and connection != 'keep-alive':
+            return False
+        return 'content-length' in headers or headers.get('transfer-encoding', '').lower() == 'chunked'
+
+    @staticmethod
+    async def _read_body(reader, headers):
+        "Generate the chunks of the response body"
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    # the trailer
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    return
+                yield await reader.readexactly(size)
+                await reader.readexactly(2)
+        elif 'content-length' in headers:
+            remaining = int(headers['content-length'])
+            while remaining:
+                data = await reader.read(min(65536, remaining))
+                if not data:
+                    raise asyncio.IncompleteReadError(b'', remaining)
+                remaining -= len(data)
+                yield data
+        else:
+            while data := await reader.read(65536):
+                yield data
+
+    async def _parse_response(self, reader, headers):
+        decompressor = None
+        if headers.get('content-encoding', '') == 'gzip':
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        parser, unmarshaller = client.getparser()
+        async for data in self._read_body(reader, headers):
+            if decompressor:
+                data = decompressor.decompress(data)
+            parser.feed(data)
+        if decompressor:
+            parser.feed(decompressor.flush())
+        parser.close()
+        return unmarshaller.close()
+
+    def _release(self, reader, writer, keep_alive):
+        if keep_alive:
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+        for _, writer in idle:
+            with contextlib.suppress(Exception):
+                await writer.wait_closed()
+
+class _AsyncMethod:
+    def __init__(self, request, name):
+        self._request = request
+        self._name = name
+
+    def __getattr__(self, name):
+        return _AsyncMethod(self._request, f'{self._name}.{name}')
+
+    def __call__(self, *args):
+        return self._request(self._name, args)
+
+class AsyncServerProxy:
+    """
+    Asynchronous counterpart of ``client.ServerProxy``::
+
+        proxy = AsyncServerProxy(trac_url)
+        ticket = await proxy.ticket.get(1)
+
+    If ``scheduler`` is given, the requests are paced and retried by this
+    :class:`trac_xmlrpc.RpcScheduler`.
+    """
+    def __init__(self, url, max_connections=4, scheduler=None, allow_none=False):
+        self._transport = AsyncTransport(url, max_connections)
+        self._scheduler = scheduler
+        self._allow_none = allow_none
+
+    async def _send(self, request_body):
+        response = await self._transport.request(request_body)
+        if len(response) == 1:
+            response = response[0]
+        return response
+
+    async def _request(self, methodname, params):
+        request_body = client.dumps(params, methodname, encoding='utf-8',
+                                    allow_none=self._allow_none).encode('utf-8')
+        if self._scheduler:
+            return await self._scheduler.acall(self._send, request_body)
+        return await self._send(request_body)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return _AsyncMethod(self._request, name)
+
+    async def close(self):
+        await self._transport.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+async def fetch_all(proxy, calls, on_result, concurrency=4):
+    """
+    Make the calls ``(methodname, args)`` of the iterable ``calls`` with the
+    :class:`AsyncServerProxy` ``proxy``, keeping up to ``concurrency`` requests
+    in flight, and pass each ``methodname, args, result`` to ``on_result``.
+
+    The result of a failed call is the exception. ``calls`` is consumed lazily,
+    so that it may be a generator over many calls.
+    """
+    calls = iter(calls)
+
+    async def worker():
+        for methodname, args in calls:
+            try:
+                result = await functools.reduce(getattr, methodname.split('.'), proxy)(*args)
+            except Exception as e:
+                result = e
+            on_result(methodname, args, result)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+
+def fetch(url, calls, on_result, concurrency=4, scheduler=None):
+    """
+    Run :func:`fetch_all` with a new :class:`AsyncServerProxy` for ``url``
+    in a new event loop.
+    """
+    async def main():
+        async with AsyncServerProxy(url, max_connections=concurrency, scheduler=scheduler) as proxy:
+            await fetch_all(proxy, calls, on_result, concurrency=concurrency)
+    asyncio.run(main())